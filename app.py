@@ -1,28 +1,284 @@
 # TELEGRAM RESERVATION SYSTEM - COMPLETE VERSION
-from flask import Flask, jsonify, request, abort
+from flask import (Blueprint, Flask, Response, current_app, g, has_request_context, jsonify, request, abort,
+                   stream_with_context)
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import click
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from threading import Thread
-from datetime import datetime
+import threading
+from threading import Thread, Lock
+from queue import Queue, Empty, Full
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque, OrderedDict
+from datetime import datetime, timedelta, time as dt_time
+import time
+import json
+import base64
+import csv
+import gzip
+import functools
+import hashlib
+import hmac
+import select
+import random
 import uuid  # For generating unique tokens
+from types import SimpleNamespace
 
-app = Flask(__name__)
-CORS(app)
+# Routes and CLI commands live on this blueprint; create_app() attaches it
+bp = Blueprint("reservations", __name__, cli_group=None)
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+def configure_logging():
+    """Install the root handler; a no-op when the host process already did."""
+    log_handler = logging.StreamHandler()
+    if os.getenv('LOG_FORMAT', 'text') == 'json':
+        log_handler.setFormatter(JsonLogFormatter())
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), handlers=[log_handler])
+
 logger = logging.getLogger(__name__)
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+
+def log_payload(message, data):
+    """Debug-log a request payload; skipped entirely unless DEBUG is on, then sampled."""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE:
+        logger.debug(f"{message}: {data}")
+
+# Metrics (Prometheus text format)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, format_labels(self.labels, k), v) for k, v in self._values.items()]
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, counts in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    out.append((f"{self.name}_bucket", format_labels(self.labels, key, [("le", bound)]), count))
+                out.append((f"{self.name}_bucket", format_labels(self.labels, key, [("le", "+Inf")]), counts[-2]))
+                out.append((f"{self.name}_count", format_labels(self.labels, key), counts[-2]))
+                out.append((f"{self.name}_sum", format_labels(self.labels, key), counts[-1]))
+        return out
+
+class Gauge:
+    """Gauge whose value is read from ``fn`` at scrape time; ``fn`` may return
+    a number or a {label value: number} dict for a single label."""
+    type = "gauge"
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name, self.help, self.fn, self.labels = name, help, fn, labels
+
+    def samples(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            return [(self.name, format_labels(self.labels, (k,)), v) for k, v in value.items()]
+        return [(self.name, "", value)]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+REQUEST_LATENCY = metrics.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")))
+REQUEST_DB_QUERIES = metrics.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50)))
+REQUEST_DB_TIME = metrics.register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request.", ("route",)))
+DB_QUERY_LATENCY = metrics.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by statement type.", ("statement",)))
+OUTBOUND_LATENCY = metrics.register(Histogram(
+    "outbound_request_duration_seconds", "Telegram and SMTP call latency.", ("service", "method")))
+OUTBOUND_ERRORS = metrics.register(Counter(
+    "outbound_request_errors_total", "Failed Telegram and SMTP calls.", ("service", "method")))
+
+def observe_outbound(service, method, seconds, error=False):
+    OUTBOUND_LATENCY.observe(seconds, service=service, method=method)
+    if error:
+        OUTBOUND_ERRORS.inc(service=service, method=method)
+
+DB_POOL_WAIT = metrics.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30)))
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, pool=self._orig_logging_name)
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql:///reservations')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+def engine_options(url, name):
+    """Pool, connect and statement timeout settings for one database URL.
+
+    Each gunicorn worker gets its own pool, so the primary sees up to
+    workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    """
+    url = make_url(url)
+    options = {"logging_name": name, "pool_logging_name": name}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options  # single shared connection, nothing to tune
+    options.update({
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv('DB_POOL_SIZE', 5)),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        "pool_timeout": float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        "pool_pre_ping": os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    })
+    if url.get_backend_name() == "postgresql":
+        connect_args = {"connect_timeout": int(os.getenv('DB_CONNECT_TIMEOUT', 5))}
+        if statement_timeout := int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0)):
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+        options["connect_args"] = connect_args
+    return options
+
+class ReplicaRouter:
+    """Tracks whether reads may go to the DATABASE_REPLICA_URL bind.
+
+    Views opt in with ``@read_replica``. A connection failure on the replica
+    takes it out of rotation for DB_REPLICA_RETRY seconds so reads go to the
+    primary meanwhile.
+    """
+
+    def __init__(self, url, retry):
+        self.url = url
+        self.retry = retry
+        self.down_until = 0.0
+
+    def active(self):
+        return (self.url is not None and has_request_context() and g.get("db_bind") == "replica"
+                and time.monotonic() >= self.down_until)
+
+    def mark_down(self, error):
+        if time.monotonic() >= self.down_until:
+            logger.warning(f"Read replica unavailable, using the primary for {self.retry}s: {error}")
+        self.down_until = time.monotonic() + self.retry
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Flushes are writes and always go to the primary
+        if bind is None and not self._flushing and replica.active():
+            return self._db.engines["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+replica = ReplicaRouter(None, int(os.getenv('DB_REPLICA_RETRY', 30)))
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+@event.listens_for(Engine, "handle_error")
+def _replica_error(context):
+    if context.engine is not None and context.engine.logging_name == "replica" and (
+            context.is_disconnect or context.connection is None):
+        replica.mark_down(context.original_exception)
+        if has_request_context():
+            g.replica_failed = True
+
+def read_replica(retry_statuses=()):
+    """Serve a read-only view from the replica when one is configured.
+
+    The view is run again on the primary if the replica connection failed
+    during the request, or if it answered with a status in ``retry_statuses``
+    (e.g. a 404 for a row the replica has not received yet).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if replica.url is None:
+                return view(*args, **kwargs)
+            g.db_bind = "replica"
+            response = current_app.make_response(view(*args, **kwargs))
+            if g.pop("replica_failed", False) or (replica.active() and response.status_code in retry_statuses):
+                g.db_bind = None
+                db.session.rollback()
+                return view(*args, **kwargs)
+            return response
+        return wrapper
+    return decorator
 
 class Reservation(db.Model):
     __tablename__ = 'reservation'
@@ -30,169 +286,1512 @@ class Reservation(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
-    time = db.Column(db.String(10), nullable=False)
-    date = db.Column(db.String(10), nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    date = db.Column(db.Date, nullable=False)
     diners = db.Column(db.Integer, nullable=False)
     seating = db.Column(db.String(20), nullable=False)
     pickup = db.Column(db.String(10), nullable=False)
     status = db.Column(db.String(20), default="Pending", nullable=True)
     denial_reason = db.Column(db.String(200), nullable=True)
     token = db.Column(db.String(36), nullable=False, unique=True)  # Add token field
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, default=1, nullable=False)  # bumped on every UPDATE, used as the ETag
+    __table_args__ = (
+        db.Index('ix_reservation_date_time', 'date', 'time'),
+        db.Index('ix_reservation_status_date', 'status', 'date'),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class ReservationArchive(db.Model):
+    """Past reservations moved out of ``reservation`` by archive-reservations.
+
+    Same columns and ids as the hot table, so archived bookings still resolve
+    by id and token; rows are read-only once here.
+    """
+    __tablename__ = 'reservation_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    diners = db.Column(db.Integer, nullable=False)
+    seating = db.Column(db.String(20), nullable=False)
+    pickup = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=True)
+    denial_reason = db.Column(db.String(200), nullable=True)
+    token = db.Column(db.String(36), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class SlotCapacity(db.Model):
+    """Maximum diners for a (time slot, seating); rows with a NULL date apply to every date."""
+    __tablename__ = 'slot_capacity'
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=True)
+    time = db.Column(db.Time, nullable=False)
+    seating = db.Column(db.String(20), nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    __table_args__ = (db.UniqueConstraint('date', 'time', 'seating', name='uq_slot_capacity_slot'),)
+
+class SlotOccupancy(db.Model):
+    """Diners booked per slot, kept in step with reservation status changes."""
+    __tablename__ = 'slot_occupancy'
+    date = db.Column(db.Date, primary_key=True)
+    time = db.Column(db.Time, primary_key=True)
+    seating = db.Column(db.String(20), primary_key=True)
+    pending = db.Column(db.Integer, default=0, nullable=False)
+    confirmed = db.Column(db.Integer, default=0, nullable=False)
 
-# Email configuration
-app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.sendgrid.net')
-app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
-app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-app.config['SENDER_EMAIL'] = os.getenv('SENDER_EMAIL', 'no-reply@reservations.com')
+TIME_FORMATS = ("%I:%M %p", "%H:%M", "%H:%M:%S")
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def parse_time(value):
+    """Parse the booking app's "7:00 PM" format, or 24-hour HH:MM[:SS]."""
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value.strip().upper(), fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value!r}")
+
+def format_date(value):
+    return value.isoformat()
+
+def format_time(value):
+    # Same "7:00 PM" shape the booking app sends and parses back
+    return f"{value.hour % 12 or 12}:{value.minute:02d} {'AM' if value.hour < 12 else 'PM'}"
+
+# Application configuration
+def config_from_env():
+    """Application settings read from the environment; create_app() overrides apply on top."""
+    return {
+        'SQLALCHEMY_DATABASE_URI': os.getenv('DATABASE_URL', 'postgresql:///reservations'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'DATABASE_REPLICA_URL': os.getenv('DATABASE_REPLICA_URL') or None,
+        'PROXY_FIX_X_FOR': int(os.getenv('PROXY_FIX_X_FOR', 0)),
+        'MAIL_SERVER': os.getenv('MAIL_SERVER', 'smtp.sendgrid.net'),
+        'MAIL_PORT': int(os.getenv('MAIL_PORT', 587)),
+        'MAIL_USE_TLS': os.getenv('MAIL_USE_TLS', 'true').lower() == 'true',
+        'MAIL_USERNAME': os.getenv('MAIL_USERNAME'),
+        'MAIL_PASSWORD': os.getenv('MAIL_PASSWORD'),
+        'SENDER_EMAIL': os.getenv('SENDER_EMAIL', 'no-reply@reservations.com'),
+    }
 
 # Telegram setup
 telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
 telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID')
 
+
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # email, telegram_new, telegram_edit
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default="pending", nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),)
+
+class TelegramUpdate(db.Model):
+    __tablename__ = 'telegram_update'
+    update_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending, processing, done, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    __table_args__ = (db.Index('ix_telegram_update_status_received', 'status', 'received_at'),)
+
+class IdempotencyRecord(db.Model):
+    """Stored response of a reservation submission, replayed for retries.
+
+    Keys are ``key:<Idempotency-Key header>`` or ``content:<hash of the booking>``.
+    """
+    __tablename__ = 'idempotency_record'
+    key = db.Column(db.String(200), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    __tablename__ = 'rate_limit_bucket'
+    key = db.Column(db.String(200), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class AppState(db.Model):
+    __tablename__ = 'app_state'
+    namespace = db.Column(db.String(50), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DatabaseStateBackend:
+    """Stores state as JSON rows in the ``app_state`` table, shared by every worker.
+
+    Writes use their own connection and commit immediately, independent of the
+    request's session.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.table = AppState.__table__
+
+    def init_app(self, app):
+        self.app = app
+
+    def get(self, namespace, key):
+        with self.app.app_context(), db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(self.table.c.value, self.table.c.expires_at)
+                .where(self.table.c.namespace == namespace, self.table.c.key == key)
+            ).first()
+            if row is None:
+                return None
+            if row.expires_at is not None and row.expires_at < datetime.utcnow():
+                conn.execute(self._delete(namespace, key))
+                return None
+            return json.loads(row.value)
+
+    def set(self, namespace, key, value, ttl=None):
+        values = {
+            "value": json.dumps(value),
+            "expires_at": datetime.utcnow() + timedelta(seconds=ttl) if ttl else None,
+        }
+        with self.app.app_context(), db.engine.begin() as conn:
+            updated = conn.execute(
+                self.table.update()
+                .where(self.table.c.namespace == namespace, self.table.c.key == key)
+                .values(**values)
+            )
+            if updated.rowcount == 0:
+                conn.execute(self.table.insert().values(namespace=namespace, key=key, **values))
+
+    def delete(self, namespace, key):
+        with self.app.app_context(), db.engine.begin() as conn:
+            conn.execute(self._delete(namespace, key))
+
+    def purge_expired(self):
+        with self.app.app_context(), db.engine.begin() as conn:
+            return conn.execute(
+                self.table.delete().where(self.table.c.expires_at < datetime.utcnow())
+            ).rowcount
+
+    def _delete(self, namespace, key):
+        return self.table.delete().where(self.table.c.namespace == namespace, self.table.c.key == key)
+
+
+class LocalKeyValueStore:
+    """In-process stand-in for a Redis-style client (``get``/``set(ex=)``/``delete``)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class KeyValueStateBackend:
+    """Stores state in any client exposing Redis-style ``get``/``set(ex=)``/``delete``."""
+
+    def __init__(self, client, prefix="lacasita"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def get(self, namespace, key):
+        value = self.client.get(self._key(namespace, key))
+        return None if value is None else json.loads(value)
+
+    def set(self, namespace, key, value, ttl=None):
+        self.client.set(self._key(namespace, key), json.dumps(value), ex=ttl)
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+
+class StateNamespace:
+    """Dict-like view of one namespace in the state backend, fronted by a TTLCache.
+
+    The cache only holds values this process has read or written recently, so
+    other workers see changes once the backend is written and local entries
+    age out after ``cache_ttl`` seconds.
+    """
+
+    def __init__(self, backend, namespace, ttl=None, cache_ttl=60, cache_size=1024):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def get(self, key, default=None):
+        key = str(key)
+        value = self.cache.get(key)
+        if value is None:
+            value = self.backend.get(self.namespace, key)
+            if value is None:
+                return default
+            self.cache.set(key, value)
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        key = str(key)
+        self.backend.set(self.namespace, key, value, ttl=self.ttl)
+        self.cache.set(key, value)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        key = str(key)
+        self.cache.delete(key)
+        self.backend.delete(self.namespace, key)
+        return value
+
+
+def create_state_backend(kind):
+    if kind == 'database':
+        return DatabaseStateBackend()
+    if kind == 'memory':
+        return KeyValueStateBackend(LocalKeyValueStore())
+    if kind == 'redis':
+        import redis  # optional dependency, only needed for this backend
+        return KeyValueStateBackend(redis.Redis.from_url(os.environ['REDIS_URL']))
+    raise ValueError(f"Unknown STATE_BACKEND: {kind}")
+
 # State management
-pending_denials = {}
-telegram_message_store = {}
+state_backend = create_state_backend(os.getenv('STATE_BACKEND', 'database'))
+pending_denials = StateNamespace(state_backend, 'pending_denials', ttl=24 * 3600, cache_ttl=5)
+telegram_message_store = StateNamespace(
+    state_backend, 'telegram_message', ttl=int(os.getenv('TELEGRAM_MESSAGE_TTL', 30 * 24 * 3600)), cache_ttl=300
+)
+
+class LatencyStats:
+    """Thread-safe running latency summary (count, total, max and a recent window)."""
+
+    def __init__(self, window=500):
+        self._lock = Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._recent.append(seconds)
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            count, errors, total, maximum = self.count, self.errors, self.total, self.max
+
+        def pct(p):
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 4)
+
+        return {
+            "count": count,
+            "errors": errors,
+            "avg": round(total / count, 4) if count else None,
+            "max": round(maximum, 4),
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+        }
+
+
+class SMTPWorkerPool:
+    """Fixed-size pool of email workers fed by a bounded queue.
 
-def send_email_async(app_context, subject, recipient, body):
-    def send_email():
-        with app_context:
+    Each worker keeps its own logged-in SMTP connection and reuses it for
+    several messages. Connections are dropped after ``max_messages`` sends or
+    ``idle_timeout`` seconds without traffic, and re-established (with a NOOP
+    probe before reuse) when the server has closed them in the meantime.
+    """
+
+    def __init__(self, size=2, queue_size=1000, max_messages=100, idle_timeout=60,
+                 probe_after=5, max_retries=1):
+        self.config = None
+        self.probe_after = probe_after
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.queue = Queue(maxsize=queue_size)
+        self.latency = LatencyStats()
+        self._workers = []
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.config = app.config
+
+    def start(self):
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            for i in range(len(self._workers), self.size):
+                worker = Thread(target=self._run, name=f"smtp-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, msg):
+        """Queue a message for delivery; returns a Future resolved once it is sent."""
+        if len(self._workers) < self.size:
+            self.start()
+        future = Future()
+        self.queue.put_nowait((msg, future))
+        return future
+
+    def stats(self):
+        return {
+            "workers": sum(1 for w in self._workers if w.is_alive()),
+            "queue_depth": self.queue.qsize(),
+            "send_latency": self.latency.snapshot(),
+        }
+
+    def _connect(self):
+        start = time.monotonic()
+        try:
+            server = smtplib.SMTP(self.config['MAIL_SERVER'], self.config['MAIL_PORT'], timeout=30)
+            if self.config['MAIL_USE_TLS']:
+                server.starttls()
+            if self.config['MAIL_USERNAME']:
+                server.login(self.config['MAIL_USERNAME'], self.config['MAIL_PASSWORD'])
+        except Exception:
+            observe_outbound("smtp", "connect", time.monotonic() - start, error=True)
+            raise
+        observe_outbound("smtp", "connect", time.monotonic() - start)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _is_alive(self, server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _run(self):
+        server = None
+        sent = 0
+        last_used = 0.0
+        while True:
             try:
-                msg = MIMEMultipart()
-                msg['From'] = app.config['SENDER_EMAIL']
-                msg['To'] = recipient
-                msg['Subject'] = subject
-                msg.attach(MIMEText(body, 'html'))
-
-                with smtplib.SMTP(app.config['MAIL_SERVER'], app.config['MAIL_PORT']) as server:
-                    if app.config['MAIL_USE_TLS']:
-                        server.starttls()
-                    server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+                msg, future = self.queue.get(timeout=self.idle_timeout)
+            except Empty:
+                if server is not None:
+                    self._close(server)
+                    server = None
+                continue
+
+            if not future.set_running_or_notify_cancel():
+                self.queue.task_done()
+                continue
+
+            start = time.monotonic()
+            attempt = 0
+            while True:
+                try:
+                    if server is not None and (
+                        sent >= self.max_messages
+                        or (start - last_used > self.probe_after and not self._is_alive(server))
+                    ):
+                        self._close(server)
+                        server = None
+                    if server is None:
+                        server = self._connect()
+                        sent = 0
+                    send_start = time.monotonic()
                     server.send_message(msg)
-                logger.info(f"Email sent to {recipient}")
-            except Exception as e:
-                logger.error(f"Email sending failed: {str(e)}")
-    Thread(target=send_email).start()
+                    sent += 1
+                    last_used = time.monotonic()
+                    observe_outbound("smtp", "send_message", last_used - send_start)
+                    self.latency.observe(last_used - start)
+                    future.set_result(True)
+                    logger.info(f"Email sent to {msg['To']}")
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+                    # Stale connection: reconnect and retry once before giving up
+                    if server is not None:
+                        server.close()
+                        server = None
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        self._fail(future, start, e)
+                        break
+                except Exception as e:
+                    self._fail(future, start, e)
+                    break
+            self.queue.task_done()
+
+    def _fail(self, future, start, error):
+        self.latency.observe(time.monotonic() - start, error=True)
+        OUTBOUND_ERRORS.inc(service="smtp", method="send_message")
+        future.set_exception(error)
+        logger.error(f"Email sending failed: {str(error)}")
+
+
+email_pool = SMTPWorkerPool(
+    size=int(os.getenv('MAIL_POOL_SIZE', 2)),
+    queue_size=int(os.getenv('MAIL_QUEUE_SIZE', 1000)),
+    max_messages=int(os.getenv('MAIL_MAX_MESSAGES_PER_CONNECTION', 100)),
+    idle_timeout=int(os.getenv('MAIL_IDLE_TIMEOUT', 60)),
+)
+
+def build_email(subject, recipient, body):
+    msg = MIMEMultipart()
+    msg['From'] = current_app.config['SENDER_EMAIL']
+    msg['To'] = recipient
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'html'))
+    return msg
+
+class TelegramError(Exception):
+    def __init__(self, description, error_code=None, retry_after=None):
+        super().__init__(description)
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket that hands out send slots at ``rate`` per second.
+
+    ``reserve`` books the next slot and returns how long the caller must wait
+    for it, so concurrent senders are spaced out instead of bursting.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds):
+        """Push the bucket into debt so nothing is sent for ``seconds`` (used for 429s)."""
+        with self._lock:
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class SharedTokenBucket:
+    """TokenBucket kept in the rate_limit_bucket table, so every process that
+    sends through it (web workers, dispatch-outbox) draws from one budget."""
+
+    def __init__(self, key, rate, capacity):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
 
-def send_telegram_async(app_context, reservation):
-    def send_telegram():
-        with app_context:
+    def reserve(self):
+        return rate_limiter.reserve(self.key, self.rate, self.capacity)
+
+    def pause(self, seconds):
+        rate_limiter.pause(self.key, self.rate, self.capacity, seconds)
+
+
+class TelegramClient:
+    """Shared Bot API client: keep-alive session pool, rate limiting and retries.
+
+    Telegram allows ~30 messages/second overall, 1/second per private chat and
+    20/minute per group. Sending methods take a slot from the global bucket and
+    from the per-chat bucket before each request; a 429 pauses the relevant
+    bucket for ``retry_after`` seconds and the call is retried.
+
+    Those limits apply to the bot, not to a process. With ``shared_buckets``
+    the buckets live in the database (SharedTokenBucket), so all web workers
+    and dispatch-outbox processes split one budget at the cost of a short
+    transaction per send. Without it each process has in-memory buckets with
+    the full rates, and the rates must be divided by the number of processes.
+    """
+
+    RATE_LIMITED_METHODS = {"sendMessage", "editMessageText"}
+
+    def __init__(self, token, api_url="https://api.telegram.org", pool_size=10,
+                 timeout=(3.05, 10), max_retries=3, max_retry_after=30,
+                 global_rate=30, chat_rate=1, group_rate=20 / 60, shared_buckets=False):
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.shared_buckets = shared_buckets
+        self.global_bucket = self._bucket("global", global_rate, global_rate)
+        self._chat_buckets = {}
+        self._lock = Lock()
+        self.latency = LatencyStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _chat_bucket(self, chat_id):
+        chat_id = str(chat_id)
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                # Group and channel ids are negative
+                rate = self.group_rate if chat_id.startswith("-") else self.chat_rate
+                bucket = self._chat_buckets[chat_id] = self._bucket(f"chat:{chat_id}", rate, 1)
+            return bucket
+
+    def _bucket(self, name, rate, capacity):
+        if self.shared_buckets:
+            return SharedTokenBucket(f"telegram:{name}", rate, capacity)
+        return TokenBucket(rate, capacity)
+
+    def _wait_for_slot(self, chat_id):
+        buckets = [self.global_bucket]
+        if chat_id is not None:
+            buckets.append(self._chat_bucket(chat_id))
+        delay = max(bucket.reserve() for bucket in buckets)
+        if delay > 0:
+            time.sleep(delay)
+
+    def call(self, method, payload, timeout=None, retries=None):
+        """Call a Bot API method and return its ``result``; raises TelegramError."""
+        retries = self.max_retries if retries is None else retries
+        chat_id = payload.get("chat_id")
+        attempt = 0
+        while True:
+            if method in self.RATE_LIMITED_METHODS:
+                self._wait_for_slot(chat_id)
+            start = time.monotonic()
             try:
-                message = f"""New Reservation Request:
+                response = self.session.post(
+                    f"{self.base_url}/{method}", json=payload, timeout=timeout or self.timeout
+                )
+                body = response.json()
+            except (requests.RequestException, ValueError) as e:
+                self.latency.observe(time.monotonic() - start, error=True)
+                observe_outbound("telegram", method, time.monotonic() - start, error=True)
+                error = TelegramError(f"{method} request failed: {e}")
+                delay = 0.5 * 2 ** attempt
+            else:
+                self.latency.observe(time.monotonic() - start, error=not body.get("ok"))
+                observe_outbound("telegram", method, time.monotonic() - start, error=not body.get("ok"))
+                if body.get("ok"):
+                    return body.get("result")
+                params = body.get("parameters") or {}
+                error = TelegramError(
+                    body.get("description", response.text),
+                    error_code=body.get("error_code", response.status_code),
+                    retry_after=params.get("retry_after"),
+                )
+                if response.status_code == 429:
+                    delay = min(float(error.retry_after or 1), self.max_retry_after)
+                    (self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket).pause(delay)
+                    delay = 0  # the bucket now enforces the wait
+                elif response.status_code >= 500:
+                    delay = 0.5 * 2 ** attempt
+                else:
+                    raise error
+
+            attempt += 1
+            if attempt > retries:
+                raise error
+            logger.warning(f"Telegram {method} failed ({error}), retry {attempt}/{retries}")
+            if delay:
+                time.sleep(delay)
+
+
+telegram = TelegramClient(
+    telegram_bot_token,
+    api_url=os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org'),
+    pool_size=int(os.getenv('TELEGRAM_POOL_SIZE', 10)),
+    max_retries=int(os.getenv('TELEGRAM_MAX_RETRIES', 3)),
+    global_rate=float(os.getenv('TELEGRAM_GLOBAL_RATE', 30)),
+    chat_rate=float(os.getenv('TELEGRAM_CHAT_RATE', 1)),
+    group_rate=float(os.getenv('TELEGRAM_GROUP_RATE', 20 / 60)),
+    shared_buckets=os.getenv('TELEGRAM_SHARED_RATE_LIMIT', 'true').lower() == 'true',
+)
+telegram_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('TELEGRAM_MAX_WORKERS', 4)), thread_name_prefix="telegram"
+)
+
+class SlotFullError(Exception):
+    pass
+
+# Which occupancy counter a reservation in each status counts towards
+OCCUPANCY_COLUMNS = {None: 'pending', 'Pending': 'pending', 'Confirmed': 'confirmed'}
+
+availability_cache = TTLCache(maxsize=366, ttl=int(os.getenv('AVAILABILITY_CACHE_TTL', 30)))
+reservation_cache = TTLCache(
+    maxsize=int(os.getenv('RESERVATION_CACHE_SIZE', 2048)),
+    ttl=int(os.getenv('RESERVATION_CACHE_TTL', 10)),
+)
+
+class StatusBroker:
+    """Fans reservation status changes out to the SSE streams waiting on them.
+
+    On PostgreSQL changes travel via ``NOTIFY reservation_status`` and every
+    process runs one LISTEN thread, so a status committed by any worker reaches
+    streams held by all of them. Other databases fall back to in-process
+    delivery. Each stream gets a small bounded queue; when a slow client lets it
+    fill up, the oldest event is dropped since only the latest status matters.
+    Every delivered change also evicts the reservation from this process's
+    reservation_cache, so no worker keeps serving the old status.
+    """
+
+    CHANNEL = 'reservation_status'
+
+    def __init__(self, max_streams=500, queue_size=8):
+        self.app = None
+        self.max_streams = max_streams
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._count = 0
+        self._lock = Lock()
+        self._listener = None
+        self._postgres = None
+
+    def init_app(self, app):
+        self.app = app
+        self._postgres = None
+
+    def use_postgres(self):
+        if self._postgres is None:
+            with self.app.app_context():
+                self._postgres = (
+                    os.getenv('STATUS_BROKER', 'auto') != 'local'
+                    and db.engine.dialect.name == 'postgresql'
+                )
+        return self._postgres
+
+    def start(self):
+        """Start this process's LISTEN thread (PostgreSQL only)."""
+        if self.use_postgres():
+            self._start_listener()
+
+    def subscribe(self, reservation_id):
+        """Return a queue of status events, or None if this process is at max_streams."""
+        self.start()
+        subscription = Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self._count >= self.max_streams:
+                return None
+            self._subscribers.setdefault(reservation_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, reservation_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(reservation_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[reservation_id]
+
+    def publish(self, *events):
+        if not self.use_postgres():
+            for event in events:
+                self._deliver(event)
+            return
+        try:
+            with self.app.app_context(), db.engine.begin() as conn:
+                conn.execute(db.text("SELECT pg_notify(:channel, :payload)"),
+                             [{"channel": self.CHANNEL, "payload": json.dumps(event)} for event in events])
+        except Exception as e:
+            logger.error(f"Failed to publish status change: {str(e)}")
+
+    def _deliver(self, event):
+        # Runs in every worker for NOTIFY events, so each drops its own copies
+        reservation_cache.delete(event["reservation_id"])
+        if event.get("date"):
+            availability_cache.delete(parse_date(event["date"]))
+        with self._lock:
+            subscribers = list(self._subscribers.get(event["reservation_id"], ()))
+        for subscription in subscribers:
+            while True:
+                try:
+                    subscription.put_nowait(event)
+                    break
+                except Full:
+                    try:
+                        subscription.get_nowait()
+                    except Empty:
+                        pass
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = Thread(target=self._listen, name="status-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    raw = db.engine.raw_connection()
+                raw.detach()  # this connection lives outside the pool for good
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {self.CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                logger.error(f"Status listener failed, reconnecting: {str(e)}")
+                time.sleep(5)
+
+
+# Each open stream holds a gthread worker thread for up to SSE_MAX_DURATION, so
+# by default only a quarter of a worker's threads may be streaming; the rest
+# stay free for bookings, webhooks and everything else.
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', max(1, int(os.getenv('GUNICORN_THREADS', 8)) // 4)))
+status_broker = StatusBroker(max_streams=SSE_MAX_STREAMS)
+
+def reservation_changed(*reservations):
+    """Drop this process's cached views of reservations after their change is
+    committed, and push the new status to anyone streaming them."""
+    for reservation in reservations:
+        reservation_cache.delete(reservation.id)
+        availability_cache.delete(reservation.date)
+    status_broker.publish(*(status_event(r) for r in reservations))
+
+def status_event(reservation):
+    return {
+        "reservation_id": reservation.id,
+        "status": reservation.status,
+        "denial_reason": reservation.denial_reason,
+        "date": format_date(reservation.date),
+    }
+
+def adjust_occupancy(date, time_, seating, pending=0, confirmed=0):
+    """Add to a slot's counters inside the current transaction.
+
+    The UPDATE row-locks the counter, so concurrent bookings for the same slot
+    are serialised until the surrounding transaction ends.
+    """
+    table = SlotOccupancy.__table__
+    slot = (table.c.date == date, table.c.time == time_, table.c.seating == seating)
+    update = table.update().where(*slot).values(
+        pending=table.c.pending + pending, confirmed=table.c.confirmed + confirmed
+    )
+    if db.session.execute(update).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(
+                date=date, time=time_, seating=seating, pending=pending, confirmed=confirmed
+            ))
+    except IntegrityError:
+        # Another transaction created the row first
+        db.session.execute(update)
+
+def slot_capacity(date, time_, seating):
+    """Configured capacity for a slot (date-specific rows win), or None if unlimited."""
+    return db.session.query(SlotCapacity.capacity).filter(
+        db.or_(SlotCapacity.date == date, SlotCapacity.date.is_(None)),
+        SlotCapacity.time == time_,
+        SlotCapacity.seating == seating,
+    ).order_by(SlotCapacity.date.is_(None)).limit(1).scalar()
+
+def reserve_slot(reservation):
+    """Count a new pending reservation, raising SlotFullError if it overbooks the slot."""
+    adjust_occupancy(reservation.date, reservation.time, reservation.seating, pending=reservation.diners)
+    capacity = slot_capacity(reservation.date, reservation.time, reservation.seating)
+    if capacity is None:
+        return
+    booked = db.session.query(SlotOccupancy.pending + SlotOccupancy.confirmed).filter_by(
+        date=reservation.date, time=reservation.time, seating=reservation.seating
+    ).scalar()
+    if booked > capacity:
+        raise SlotFullError(f"{reservation.seating} at {format_time(reservation.time)} is fully booked")
+
+def occupancy_delta(old_status, new_status, diners):
+    """Counter changes for moving ``diners`` from one status to another."""
+    old_column = OCCUPANCY_COLUMNS.get(old_status)
+    new_column = OCCUPANCY_COLUMNS.get(new_status)
+    delta = {}
+    if old_column != new_column:
+        if old_column:
+            delta[old_column] = -diners
+        if new_column:
+            delta[new_column] = delta.get(new_column, 0) + diners
+    return delta
+
+def set_reservation_status(reservation, status):
+    """Change a reservation's status and move its diners between occupancy counters."""
+    delta = occupancy_delta(reservation.status, status, reservation.diners)
+    reservation.status = status
+    if delta:
+        adjust_occupancy(reservation.date, reservation.time, reservation.seating, **delta)
+
+BULK_MAX_RESERVATIONS = int(os.getenv('BULK_MAX_RESERVATIONS', 500))
+
+def bulk_set_status(status, reservation_ids=None, date=None, reason=None, limit=None):
+    """Move still-pending reservations to ``status`` with one UPDATE.
+
+    Targets ``reservation_ids`` and/or every pending reservation on ``date``.
+    The rows are locked, updated together (bumping ``version`` and
+    ``updated_at`` by hand since this bypasses the ORM), and their occupancy
+    counters adjusted once per slot. The Telegram edits and customer emails are
+    added to the outbox in a single INSERT. At most ``limit`` (default
+    BULK_MAX_RESERVATIONS) reservations are changed. Nothing is committed; returns the changed reservations, with their
+    new status, for the caller to pass to reservation_changed() after
+    committing, and whether more matching reservations were left pending.
+    """
+    limit = limit or BULK_MAX_RESERVATIONS
+    table = Reservation.__table__
+    query = db.select(table).where(db.or_(table.c.status == "Pending", table.c.status.is_(None)))
+    if reservation_ids is not None:
+        query = query.where(table.c.id.in_(reservation_ids))
+    if date is not None:
+        query = query.where(table.c.date == date)
+    rows = db.session.execute(query.order_by(table.c.id).limit(limit + 1).with_for_update()).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], False
+
+    now = datetime.utcnow()
+    db.session.execute(
+        table.update().where(table.c.id.in_([r.id for r in rows])).values(
+            status=status, denial_reason=reason, version=table.c.version + 1, updated_at=now
+        )
+    )
+
+    slots = {}
+    for r in rows:
+        slot = slots.setdefault((r.date, r.time, r.seating), {})
+        for column, diners in occupancy_delta(r.status, status, r.diners).items():
+            slot[column] = slot.get(column, 0) + diners
+    # Fixed lock order so concurrent bulk updates can't deadlock on the counters
+    for (slot_date, slot_time, seating), delta in sorted(slots.items()):
+        adjust_occupancy(slot_date, slot_time, seating, **delta)
+
+    notifications = []
+    for r in rows:
+        if status == "Confirmed":
+            edit = accepted_message_edit(r.id, new_reservation_message(r))
+            email = confirmation_email(r)
+        else:
+            edit = denied_message_edit(r.id, new_reservation_message(r), reason)
+            email = denial_email(r, reason)
+        notifications.append({"kind": "telegram_edit", "payload": json.dumps(edit)})
+        notifications.append({"kind": "email", "payload": json.dumps(email)})
+    db.session.execute(db.insert(NotificationOutbox), notifications)
+
+    return [
+        SimpleNamespace(**{**r._asdict(), "status": status, "denial_reason": reason,
+                           "version": r.version + 1, "updated_at": now})
+        for r in rows
+    ], more
+
+def get_availability(date):
+    """Per-slot capacity and bookings for ``date``, from the counter tables."""
+    slots = {}
+    capacities = SlotCapacity.query.filter(
+        db.or_(SlotCapacity.date == date, SlotCapacity.date.is_(None))
+    ).all()
+    for row in capacities:
+        key = (row.time, row.seating)
+        if row.date is not None or key not in slots:
+            slots[key] = row.capacity
+    booked = {
+        (row.time, row.seating): row.pending + row.confirmed
+        for row in SlotOccupancy.query.filter_by(date=date).all()
+    }
+    return [
+        {
+            "time": format_time(time_),
+            "seating": seating,
+            "capacity": capacity,
+            "booked": booked.get((time_, seating), 0),
+            "available": max(0, capacity - booked.get((time_, seating), 0)),
+        }
+        for (time_, seating), capacity in sorted(slots.items())
+    ]
+
+def new_reservation_message(reservation):
+    return f"""New Reservation Request:
 Name: {reservation.name}
 Email: {reservation.email}
 Phone: {reservation.phone}
-Date: {reservation.date}
-Time: {reservation.time}
+Date: {format_date(reservation.date)}
+Time: {format_time(reservation.time)}
 Diners: {reservation.diners}
 Seating: {reservation.seating}
 Pickup: {reservation.pickup}"""
 
-                response = requests.post(
-                    f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage",
-                    json={
-                        "chat_id": telegram_chat_id,
-                        "text": message,
-                        "reply_markup": {
-                            "inline_keyboard": [
-                                [
-                                    {"text": "✅ Accept", "callback_data": f"accept_{reservation.id}"},
-                                    {"text": "❌ Deny", "callback_data": f"deny_{reservation.id}"}
-                                ]
-                            ]
-                        }
-                    },
-                    timeout=10
-                )
-                
-                if response.ok:
-                    response_data = response.json()
-                    telegram_message_store[reservation.id] = str(response_data['result']['message_id'])
-                    logger.info(f"Telegram message stored for reservation {reservation.id}")
-                else:
-                    logger.error(f"Telegram API error: {response.text}")
-            except Exception as e:
-                logger.error(f"Telegram failed: {str(e)}")
-    Thread(target=send_telegram).start()
+def send_new_reservation_message(reservation_id, text):
+    result = telegram.call("sendMessage", {
+        "chat_id": telegram_chat_id,
+        "text": text,
+        "reply_markup": {
+            "inline_keyboard": [
+                [
+                    {"text": "✅ Accept", "callback_data": f"accept_{reservation_id}"},
+                    {"text": "❌ Deny", "callback_data": f"deny_{reservation_id}"}
+                ]
+            ]
+        }
+    })
+    telegram_message_store[reservation_id] = str(result['message_id'])
+    logger.info(f"Telegram message stored for reservation {reservation_id}")
 
 def update_telegram_message(reservation_id, new_text, new_markup=None):
+    message_id = telegram_message_store.get(reservation_id)
+    if not message_id:
+        raise TelegramError(f"No message ID found for reservation {reservation_id}")
+
+    payload = {
+        "chat_id": telegram_chat_id,
+        "message_id": message_id,
+        "text": new_text
+    }
+
+    if new_markup:
+        payload["reply_markup"] = new_markup
+
     try:
-        message_id = telegram_message_store.get(reservation_id)
-        if not message_id:
-            logger.error(f"No message ID found for reservation {reservation_id}")
-            return
+        telegram.call("editMessageText", payload, timeout=(3.05, 5))
+    except TelegramError as e:
+        # Re-delivered edits are harmless
+        if "message is not modified" not in str(e):
+            raise
+    logger.info(f"Telegram message updated for reservation {reservation_id}")
 
-        payload = {
-            "chat_id": telegram_chat_id,
-            "message_id": message_id,
-            "text": new_text
+def accepted_message_edit(reservation_id, original_text):
+    return {
+        "reservation_id": reservation_id,
+        "text": f"✅ Accepted\n{original_text}",
+        "markup": {
+            "inline_keyboard": [
+                [
+                    {"text": "Accepted", "callback_data": f"done_{reservation_id}"},
+                    {"text": "Deny", "callback_data": f"done_{reservation_id}"}
+                ]
+            ]
         }
-        
-        if new_markup:
-            payload["reply_markup"] = new_markup
+    }
+
+def denied_message_edit(reservation_id, original_text, reason):
+    return {
+        "reservation_id": reservation_id,
+        "text": f"❌ Denied\n{original_text}\nReason: {reason}",
+        "markup": {
+            "inline_keyboard": [
+                [
+                    {"text": "Accept", "callback_data": f"done_{reservation_id}"},
+                    {"text": "Denied", "callback_data": f"done_{reservation_id}"}
+                ]
+            ]
+        }
+    }
+
+def confirmation_email(reservation):
+    return {
+        "subject": "Reservation Confirmed",
+        "recipient": reservation.email,
+        "body": f"Hello {reservation.name},<br><br>" +
+                f"Your reservation has been confirmed. We look forward to seeing you at {format_time(reservation.time)} on {format_date(reservation.date)}.<br><br>"
+    }
+
+def denial_email(reservation, reason):
+    # Update booking URL to include token
+    booking_url = f"https://snack.expo.dev/@beachbar/la-casita-booking?reservation_id={reservation.id}&token={reservation.token}"
+    return {
+        "subject": "Reservation Denied",
+        "recipient": reservation.email,
+        "body": f"""Hello {reservation.name},<br><br>
+                    Sorry, we cannot take your reservation request for {format_date(reservation.date)} at {format_time(reservation.time)}.<br><br>
+                    Reason: {reason}<br><br>
+                    Click the button below to book a new time with your previous details:<br><br>
+                    <a href="{booking_url}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-align: center; text-decoration: none; display: inline-block; border-radius: 5px;">Book A New Time</a><br><br>
+                    Please contact us if you have any questions."""
+    }
 
-        response = requests.post(
-            f"https://api.telegram.org/bot{telegram_bot_token}/editMessageText",
-            json=payload,
-            timeout=5
+def enqueue_notification(kind, **payload):
+    """Add an outbox row to the current session; it is sent once the caller commits."""
+    db.session.add(NotificationOutbox(kind=kind, payload=json.dumps(payload)))
+
+def enqueue_email(subject, recipient, body):
+    enqueue_notification('email', subject=subject, recipient=recipient, body=body)
+
+def enqueue_telegram_edit(reservation_id, text, markup=None):
+    enqueue_notification('telegram_edit', reservation_id=reservation_id, text=text, markup=markup)
+
+
+# Sent and permanently failed notifications are kept this long for debugging
+OUTBOX_RETENTION = int(os.getenv('OUTBOX_RETENTION', 7 * 24 * 3600))
+
+class OutboxDispatcher:
+    """Drains ``notification_outbox`` in batches.
+
+    Rows are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+    dispatchers can run side by side. Claiming moves ``next_attempt_at`` one
+    lease into the future, so rows held by a dispatcher that dies are picked up
+    again once the lease runs out. Emails go through the SMTP worker pool;
+    Telegram rows for the same reservation are sent in order, different
+    reservations in parallel.
+    """
+
+    def __init__(self, batch_size=50, max_attempts=8, base_backoff=5, max_backoff=3600, lease=300):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+
+    def claim_batch(self):
+        now = datetime.utcnow()
+        rows = (
+            NotificationOutbox.query
+            .filter(NotificationOutbox.status.in_(['pending', 'processing']),
+                    NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
         )
-        response.raise_for_status()
-        logger.info(f"Telegram message updated for reservation {reservation_id}")
-    except Exception as e:
-        logger.error(f"Failed to update Telegram message: {str(e)}")
+        for row in rows:
+            row.status = 'processing'
+            row.attempts += 1
+            row.next_attempt_at = now + timedelta(seconds=self.lease)
+        db.session.commit()
+        return rows
+
+    def deliver(self, rows):
+        """Send a claimed batch; returns {row id: error or None}."""
+        results = {}
+        email_futures = {}
+        telegram_groups = OrderedDict()
+        for row in rows:
+            payload = json.loads(row.payload)
+            if row.kind == 'email':
+                try:
+                    email_futures[row.id] = email_pool.submit(
+                        build_email(payload['subject'], payload['recipient'], payload['body'])
+                    )
+                except Full as e:
+                    results[row.id] = e
+            else:
+                telegram_groups.setdefault(payload['reservation_id'], []).append((row.id, row.kind, payload))
+
+        telegram_futures = [
+            telegram_executor.submit(self._deliver_telegram, group) for group in telegram_groups.values()
+        ]
+        for row_id, future in email_futures.items():
+            try:
+                future.result(timeout=120)
+                results[row_id] = None
+            except Exception as e:
+                results[row_id] = e
+        for future in telegram_futures:
+            results.update(future.result())
+        return results
+
+    @staticmethod
+    def _deliver_telegram(group):
+        results = {}
+        failed = None
+        for row_id, kind, payload in group:
+            if failed is not None:
+                # Keep later edits behind the one that failed
+                results[row_id] = failed
+                continue
+            try:
+                if kind == 'telegram_new':
+                    send_new_reservation_message(payload['reservation_id'], payload['text'])
+                elif kind == 'telegram_edit':
+                    update_telegram_message(payload['reservation_id'], payload['text'], payload.get('markup'))
+                else:
+                    raise ValueError(f"Unknown notification kind: {kind}")
+                results[row_id] = None
+            except Exception as e:
+                results[row_id] = failed = e
+        return results
+
+    def record(self, rows, results):
+        now = datetime.utcnow()
+        for row in rows:
+            error = results.get(row.id)
+            if error is None:
+                row.status = 'sent'
+                row.sent_at = now
+                row.last_error = None
+                continue
+            row.last_error = str(error)[:500]
+            if row.attempts >= self.max_attempts:
+                row.status = 'failed'
+                logger.error(f"Notification {row.id} ({row.kind}) failed permanently: {error}")
+            else:
+                row.status = 'pending'
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (row.attempts - 1))
+                row.next_attempt_at = now + timedelta(seconds=delay)
+                logger.warning(f"Notification {row.id} ({row.kind}) failed, retrying in {delay}s: {error}")
+        db.session.commit()
+
+    def run_once(self):
+        rows = self.claim_batch()
+        if rows:
+            self.record(rows, self.deliver(rows))
+        return len(rows)
+
+    def run_forever(self, interval=1.0):
+        while True:
+            try:
+                if self.run_once() < self.batch_size:
+                    time.sleep(interval)
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+                time.sleep(interval)
+
+def parse_rate_limit(value):
+    """Parse "<requests>/<seconds>"; empty or "0" disables the limit."""
+    if not value or value == "0":
+        return None
+    capacity, _, period = value.partition("/")
+    return int(capacity), float(period or 60)
+
+class RateLimiter:
+    """Token buckets shared by every worker through the rate_limit_bucket table.
+
+    Each check is one short transaction that row-locks the bucket, refills it
+    for the time elapsed and takes a token if one is available.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.table = RateLimitBucket.__table__
+
+    def init_app(self, app):
+        self.app = app
+
+    def allow(self, key, capacity, period):
+        """Returns (allowed, seconds until the next token)."""
+        rate = capacity / period
+
+        def take(tokens):
+            if tokens >= 1:
+                return tokens - 1, (True, 0)
+            return tokens, (False, (1 - tokens) / rate)
+
+        return self._update(key, capacity, rate, take)
+
+    def reserve(self, key, rate, capacity):
+        """Book the next token even if the bucket is empty and return how many
+        seconds the caller must wait for it (TokenBucket.reserve semantics)."""
+        return self._update(key, capacity, rate, lambda tokens: (tokens - 1, max(0.0, (1 - tokens) / rate)))
+
+    def pause(self, key, rate, capacity, seconds):
+        """Push the bucket into debt so no token is free for ``seconds``."""
+        self._update(key, capacity, rate, lambda tokens: (min(tokens, 1 - seconds * rate), None))
+
+    def _update(self, key, capacity, rate, change):
+        """Refill the bucket under a row lock, then store the token count from
+        ``change(tokens)`` and return its result."""
+        while True:
+            now = datetime.utcnow()
+            try:
+                with self.app.app_context(), db.engine.begin() as conn:
+                    row = conn.execute(
+                        db.select(self.table.c.tokens, self.table.c.updated_at)
+                        .where(self.table.c.key == key)
+                        .with_for_update()
+                    ).first()
+                    if row is None:
+                        tokens, result = change(capacity)
+                        conn.execute(self.table.insert().values(key=key, tokens=tokens, updated_at=now))
+                        return result
+                    tokens = min(capacity, row.tokens + max(0.0, (now - row.updated_at).total_seconds()) * rate)
+                    tokens, result = change(tokens)
+                    conn.execute(
+                        self.table.update().where(self.table.c.key == key).values(tokens=tokens, updated_at=now)
+                    )
+                    return result
+            except IntegrityError:
+                # Another caller created the bucket first. Retry in a new
+                # transaction: retrying inside this one would wait on a lock
+                # it holds itself (SQLite).
+                continue
+
+    def purge(self, older_than):
+        with self.app.app_context(), db.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.updated_at < older_than)).rowcount
+
+
+rate_limiter = RateLimiter()
+IP_RATE_LIMIT = parse_rate_limit(os.getenv('RATE_LIMIT_IP', '20/60'))
+# Behind a proxy remote_addr is the proxy's, so the per-IP limit needs either
+# PROXY_FIX_X_FOR or an explicit statement that clients connect directly
+RATE_LIMIT_IP_DIRECT = os.getenv('RATE_LIMIT_IP_DIRECT', 'false').lower() == 'true'
+EMAIL_RATE_LIMIT = parse_rate_limit(os.getenv('RATE_LIMIT_EMAIL', '5/600'))
+DEDUPE_WINDOW = int(os.getenv('RESERVATION_DEDUPE_WINDOW', 600))
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 3600))
+DEDUPE_FIELDS = ("name", "email", "phone", "date", "time", "diners", "seating", "pickup")
+
+def rate_limited(key, limit):
+    """429 response if ``key`` is over ``limit``, else None."""
+    if limit is None:
+        return None
+    allowed, retry_after = rate_limiter.allow(key, *limit)
+    if allowed:
+        return None
+    response = jsonify({
+        "status": "error",
+        "message": "Too many reservation requests, please try again later"
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
 
-@app.route("/api/reservations", methods=["POST"])
+def client_ip_limit():
+    """The per-IP limit, or None while the client address can't be trusted."""
+    if current_app.config['PROXY_FIX_X_FOR'] or RATE_LIMIT_IP_DIRECT:
+        return IP_RATE_LIMIT
+    return None
+
+def request_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+def content_key(data):
+    normalized = [str(data.get(f, "")).strip().lower() for f in DEDUPE_FIELDS]
+    return "content:" + hashlib.sha256("\x1f".join(normalized).encode()).hexdigest()
+
+def stored_response(key, fingerprint=None, newer_than=None):
+    """Replay of a stored submission response, a 422 for a reused key, or None."""
+    record = db.session.get(IdempotencyRecord, key)
+    if record is None or (newer_than is not None and record.created_at < newer_than):
+        return None
+    if fingerprint is not None and record.fingerprint != fingerprint:
+        return jsonify({
+            "status": "error",
+            "message": "Idempotency-Key was already used for a different request"
+        }), 422
+    response = Response(record.response_body, status=record.status_code, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+@bp.app_errorhandler(HTTPException)
+def handle_http_error(e):
+    return jsonify({
+        "status": "error",
+        "message": e.description
+    }), e.code
+
+@bp.route("/api/reservations", methods=["POST"])
 def create_reservation():
+    """Create a reservation.
+
+    Retries are answered with the original response instead of booking again:
+    by ``Idempotency-Key`` header for IDEMPOTENCY_TTL seconds, and
+    by identical content within RESERVATION_DEDUPE_WINDOW seconds. Other
+    submissions are rate limited per email address and, once the client
+    address is trustworthy (see client_ip_limit), per client IP across all
+    workers.
+    """
     try:
         if not request.is_json:
             abort(400, "Request must be JSON")
 
         data = request.get_json()
-        logger.info(f"New reservation data: {data}")
+        log_payload("New reservation data", data)
 
         required_fields = ["name", "email", "phone", "time", "date", "diners", "seating", "pickup"]
         if missing := [f for f in required_fields if f not in data]:
             abort(400, f"Missing fields: {', '.join(missing)}")
 
+        fingerprint = request_fingerprint(data)
+        replay_keys = [content_key(data)]
+        if idempotency_key := request.headers.get("Idempotency-Key"):
+            replay_keys.insert(0, f"key:{idempotency_key[:150]}")
+            if replay := stored_response(replay_keys[0], fingerprint):
+                return replay
+        dedupe_cutoff = datetime.utcnow() - timedelta(seconds=DEDUPE_WINDOW)
+        if replay := stored_response(replay_keys[-1], newer_than=dedupe_cutoff):
+            return replay
+
+        if limited := rate_limited(f"ip:{request.remote_addr}", client_ip_limit()):
+            return limited
+        if limited := rate_limited(f"email:{str(data['email']).strip().lower()}", EMAIL_RATE_LIMIT):
+            return limited
+
         try:
-            datetime.strptime(data["date"], "%Y-%m-%d")
-        except ValueError:
+            reservation_date = parse_date(data["date"])
+        except (ValueError, TypeError):
             abort(400, "Invalid date format. Use YYYY-MM-DD")
+        try:
+            reservation_time = parse_time(data["time"])
+        except (ValueError, AttributeError):
+            abort(400, "Invalid time format. Use H:MM AM/PM or HH:MM")
+        try:
+            diners = int(data["diners"])
+        except (ValueError, TypeError):
+            abort(400, "Invalid number of diners")
 
         # Generate a unique token for the reservation
         reservation = Reservation(
             name=data["name"],
             email=data["email"],
             phone=data["phone"],
-            time=data["time"],
-            date=data["date"],
-            diners=int(data["diners"]),
+            time=reservation_time,
+            date=reservation_date,
+            diners=diners,
             seating=data["seating"],
             pickup=data["pickup"],
             token=str(uuid.uuid4())  # Generate unique token
         )
 
         db.session.add(reservation)
-        db.session.commit()
+        db.session.flush()
+        try:
+            reserve_slot(reservation)
+        except SlotFullError as e:
+            db.session.rollback()
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 409
 
-        app_context = app.app_context()
-        send_telegram_async(app_context, reservation)
-        send_email_async(
-            app_context,
+        # Notifications are committed with the reservation and sent by the outbox dispatcher
+        enqueue_notification('telegram_new', reservation_id=reservation.id, text=new_reservation_message(reservation))
+        enqueue_email(
             "Reservation Request Received",
             reservation.email,
             f"""Hello {reservation.name},<br><br>
-            We've received your reservation request for {reservation.date} at {reservation.time}.<br><br>
+            We've received your reservation request for {format_date(reservation.date)} at {format_time(reservation.time)}.<br><br>
             You will receive an email soon with your reservation confirmation."""
         )
 
-        return jsonify({
+        body = {
             "status": "success",
             "message": "Reservation created",
             "reservation_id": reservation.id
-        }), 201
+        }
+        # Replace an expired content record. One committed by a concurrent
+        # request since the check above is kept, so our insert conflicts with it
+        IdempotencyRecord.query.filter(
+            IdempotencyRecord.key == replay_keys[-1], IdempotencyRecord.created_at < dedupe_cutoff
+        ).delete()
+        for key in replay_keys:
+            db.session.add(IdempotencyRecord(
+                key=key, fingerprint=fingerprint, status_code=201, response_body=json.dumps(body)
+            ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent retry committed first: answer with its response. The
+            # content key matches normalised fields, so it skips the exact
+            # fingerprint check that only an Idempotency-Key reuse warrants.
+            db.session.rollback()
+            for key in replay_keys:
+                if replay := stored_response(key, fingerprint if key.startswith("key:") else None):
+                    return replay
+            raise
+        reservation_changed(reservation)
+
+        return jsonify(body), 201
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Reservation creation failed: {str(e)}", exc_info=True)
         db.session.rollback()
@@ -201,182 +1800,448 @@ def create_reservation():
             "message": "Internal server error"
         }), 500
 
-@app.route("/telegram-callback", methods=["POST"])
-def telegram_callback():
-    logger.info("Received Telegram callback")
-    try:
-        data = request.json
-        logger.debug(f"Callback data: {data}")
-        if not data:
-            logger.error("Empty Telegram callback received")
-            return jsonify({"status": "error", "message": "Empty data"}), 400
-
-        # Handle callback queries (button presses)
-        if "callback_query" in data:
-            callback = data["callback_query"]
-            callback_data = callback["data"]
+def handle_telegram_update(data):
+    """Apply one Telegram update to the accept/deny state machine.
+
+    Safe to run more than once for the same update: transitions only happen
+    from the states they expect. Returns a short outcome label.
+    """
+    # Handle callback queries (button presses)
+    if "callback_query" in data:
+        callback = data["callback_query"]
+        callback_data = callback.get("data", "")
+
+        try:
+            action, reservation_id = callback_data.split("_")
+            reservation_id = int(reservation_id)
+        except (ValueError, IndexError):
+            logger.error(f"Invalid callback data: {callback_data}")
+            return "invalid"
+
+        reservation = db.session.get(Reservation, reservation_id)
+        if not reservation:
+            logger.error(f"Reservation not found: {reservation_id}")
+            return "not_found"
+
+        original_text = callback["message"]["text"]
+
+        # Immediately answer the callback to prevent timeout
+        try:
+            telegram.call("answerCallbackQuery", {
+                "callback_query_id": callback["id"],
+                "text": "Processing your request..."
+            }, timeout=(3.05, 5), retries=0)
+        except TelegramError as e:
+            logger.error(f"Failed to answer callback query: {str(e)}")
+
+        if action in ("accept", "deny") and reservation.status not in (None, "Pending"):
+            logger.info(f"Reservation {reservation_id} already {reservation.status}, ignoring {action}")
+            return "unchanged"
+
+        if action == "accept":
+            set_reservation_status(reservation, "Confirmed")
+            enqueue_telegram_edit(**accepted_message_edit(reservation_id, original_text))
+            enqueue_email(**confirmation_email(reservation))
+            db.session.commit()
+            reservation_changed(reservation)
             
-            try:
-                action, reservation_id = callback_data.split("_")
-                reservation_id = int(reservation_id)
-            except (ValueError, IndexError):
-                logger.error(f"Invalid callback data: {callback_data}")
-                return jsonify({"status": "error", "message": "Invalid callback data"}), 400
+            return "confirmed"
+
+        elif action == "deny":
+            pending_denials[str(callback["message"]["chat"]["id"])] = reservation_id
             
-            reservation = Reservation.query.get(reservation_id)
-            if not reservation:
-                logger.error(f"Reservation not found: {reservation_id}")
-                abort(404, "Reservation not found")
-
-            original_text = callback["message"]["text"]
-
-            # Immediately answer the callback to prevent timeout
-            requests.post(
-                f"https://api.telegram.org/bot{telegram_bot_token}/answerCallbackQuery",
-                json={
-                    "callback_query_id": callback["id"],
-                    "text": "Processing your request..."
+            enqueue_telegram_edit(
+                reservation_id,
+                f"🔄 Processing Denial\n{original_text}",
+                {
+                    "inline_keyboard": [
+                        [
+                            {"text": "Accept", "callback_data": "already_processing", "disabled": True},
+                            {"text": "Processing...", "callback_data": "already_processing", "disabled": True}
+                        ]
+                    ]
                 }
             )
+            db.session.commit()
+            
+            try:
+                telegram.call("sendMessage", {
+                    "chat_id": callback["message"]["chat"]["id"],
+                    "text": "Please provide a reason for denial:",
+                    "reply_to_message_id": callback["message"]["message_id"],
+                    "reply_markup": {"force_reply": True}
+                }, timeout=(3.05, 5))
+            except TelegramError as e:
+                logger.error(f"Failed to request denial reason: {str(e)}")
+            
+            return "awaiting_reason"
 
-            if action == "accept":
-                reservation.status = "Confirmed"
-                db.session.commit()
-                
-                update_telegram_message(
-                    reservation_id,
-                    f"✅ Accepted\n{original_text}",
-                    {
-                        "inline_keyboard": [
-                            [
-                                {"text": "Accepted", "callback_data": f"done_{reservation_id}"},
-                                {"text": "Deny", "callback_data": f"done_{reservation_id}"}
-                            ]
-                        ]
-                    }
-                )
-                
-                with app.app_context():
-                    send_email_async(
-                        app.app_context(),
-                        "Reservation Confirmed",
-                        reservation.email,
-                        f"Hello {reservation.name},<br><br>" +
-                        f"Your reservation has been confirmed. We look forward to seeing you at {reservation.time} on {reservation.date}.<br><br>"
-                    )
-                
-                return jsonify({"status": "confirmed"}), 200
+    elif ("message" in data and data["message"].get("text", "").startswith("/")
+          and "reply_to_message" not in data["message"]):
+        return handle_bulk_command(data["message"])
 
-            elif action == "deny":
-                pending_denials[str(callback["message"]["chat"]["id"])] = reservation_id
+    elif "message" in data and "reply_to_message" in data["message"]:
+        message = data["message"]
+        chat_id = str(message["chat"]["id"])
+        
+        if chat_id in pending_denials:
+            reservation = db.session.get(Reservation, pending_denials[chat_id])
+            if reservation and reservation.status in (None, "Pending"):
+                reason = message.get("text", "No reason provided")
                 
-                update_telegram_message(
-                    reservation_id,
-                    f"🔄 Processing Denial\n{original_text}",
-                    {
-                        "inline_keyboard": [
-                            [
-                                {"text": "Accept", "callback_data": "already_processing", "disabled": True},
-                                {"text": "Processing...", "callback_data": "already_processing", "disabled": True}
-                            ]
-                        ]
-                    }
-                )
+                reservation.denial_reason = reason
+                set_reservation_status(reservation, "Denied")
                 
-                requests.post(
-                    f"https://api.telegram.org/bot{telegram_bot_token}/sendMessage",
-                    json={
-                        "chat_id": callback["message"]["chat"]["id"],
-                        "text": "Please provide a reason for denial:",
-                        "reply_to_message_id": callback["message"]["message_id"],
-                        "reply_markup": {"force_reply": True}
-                    }
-                )
+                original_text = data["message"]["reply_to_message"]["text"].replace("🔄 Processing Denial\n", "")
+                
+                enqueue_telegram_edit(**denied_message_edit(reservation.id, original_text, reason))
+                enqueue_email(**denial_email(reservation, reason))
+                db.session.commit()
+                reservation_changed(reservation)
                 
-                return jsonify({"status": "awaiting_reason"}), 200
+                del pending_denials[chat_id]
+                return "denied"
 
-        elif "message" in data and "reply_to_message" in data["message"]:
-            message = data["message"]
-            chat_id = str(message["chat"]["id"])
-            
-            if chat_id in pending_denials:
-                reservation = Reservation.query.get(pending_denials[chat_id])
-                if reservation:
-                    reason = message.get("text", "No reason provided")
-                    
-                    reservation.denial_reason = reason
-                    reservation.status = "Denied"
-                    db.session.commit()
-                    
-                    original_text = data["message"]["reply_to_message"]["text"].replace("🔄 Processing Denial\n", "")
-                    
-                    update_telegram_message(
-                        reservation.id,
-                        f"❌ Denied\n{original_text}\nReason: {reason}",
-                        {
-                            "inline_keyboard": [
-                                [
-                                    {"text": "Accept", "callback_data": f"done_{reservation.id}"},
-                                    {"text": "Denied", "callback_data": f"done_{reservation.id}"}
-                                ]
-                            ]
-                        }
-                    )
-                    
-                    # Update booking URL to include token
-                    booking_url = f"https://snack.expo.dev/@beachbar/la-casita-booking?reservation_id={reservation.id}&token={reservation.token}"
-                    with app.app_context():
-                        send_email_async(
-                            app.app_context(),
-                            "Reservation Denied",
-                            reservation.email,
-                            f"""Hello {reservation.name},<br><br>
-                            Sorry, we cannot take your reservation request for {reservation.date} at {reservation.time}.<br><br>
-                            Reason: {reason}<br><br>
-                            Click the button below to book a new time with your previous details:<br><br>
-                            <a href="{booking_url}" style="background-color: #4CAF50; color: white; padding: 10px 20px; text-align: center; text-decoration: none; display: inline-block; border-radius: 5px;">Book A New Time</a><br><br>
-                            Please contact us if you have any questions."""
-                        )
-                    
-                    del pending_denials[chat_id]
-                    return jsonify({"status": "denied"}), 200
-
-        return jsonify({"status": "ignored"}), 200
+    return "ignored"
+
+
+BULK_COMMANDS = {"/acceptall": "Confirmed", "/denyall": "Denied"}
+BULK_COMMAND_USAGE = "Usage: /acceptall YYYY-MM-DD or /denyall YYYY-MM-DD [reason]"
+
+def parse_bulk_command(text):
+    """Split a staff command into (command, date, reason).
+
+    ``command`` is the first word without any "@BotName" suffix; ``date`` is
+    None when the argument is missing or not a YYYY-MM-DD date.
+    """
+    command, _, rest = text.strip().partition(" ")
+    command = command.split("@")[0]  # "/acceptall@SomeBot" in group chats
+    date_arg, _, reason = rest.strip().partition(" ")
+    try:
+        date = parse_date(date_arg)
+    except ValueError:
+        date = None
+    return command, date, reason.strip()
+
+def handle_bulk_command(message):
+    """``/acceptall <YYYY-MM-DD>`` or ``/denyall <YYYY-MM-DD> [reason]`` from the staff chat."""
+    chat_id = str(message["chat"]["id"])
+    if chat_id != str(telegram_chat_id):
+        logger.warning(f"Ignoring bulk command from chat {chat_id}")
+        return "ignored"
+
+    command, date, reason = parse_bulk_command(message["text"])
+    status = BULK_COMMANDS.get(command)
+    if status is None or date is None:
+        reply = BULK_COMMAND_USAGE
+        outcome = "invalid"
+    else:
+        changed, more = bulk_set_status(
+            status, date=date, reason=(reason or "No reason provided") if status == "Denied" else None
+        )
+        db.session.commit()
+        if changed:
+            reservation_changed(*changed)
+        verb = "Accepted" if status == "Confirmed" else "Denied"
+        reply = f"{verb} {len(changed)} pending reservation(s) for {format_date(date)}"
+        if more:
+            reply += f"; more are still pending, send {command} again"
+        outcome = "bulk_confirmed" if status == "Confirmed" else "bulk_denied"
+
+    try:
+        telegram.call("sendMessage", {
+            "chat_id": message["chat"]["id"],
+            "text": reply,
+            "reply_to_message_id": message["message_id"]
+        }, timeout=(3.05, 5))
+    except TelegramError as e:
+        logger.error(f"Failed to answer bulk command: {str(e)}")
+    return outcome
+
+
+class TelegramUpdateProcessor:
+    """Background worker that applies stored Telegram updates in arrival order.
+
+    Each update is claimed with a conditional UPDATE, so the in-process workers
+    and the ``process-telegram-updates`` command never apply the same update
+    concurrently. Between updates, and at least every ``recover_interval``
+    seconds, the thread also runs recover(): failed attempts are retried with
+    exponential backoff up to ``max_attempts``, and updates left behind by a
+    worker that exited (queued in memory or mid-processing) are picked up.
+    """
+
+    def __init__(self, max_attempts=5, recover_interval=15, base_backoff=5, max_backoff=300):
+        self.app = None
+        self.max_attempts = max_attempts
+        self.recover_interval = recover_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.queue = Queue()
+        self.latency = LatencyStats()
+        self._thread = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="telegram-updates", daemon=True)
+                self._thread.start()
+
+    def submit(self, update_id):
+        self.start()
+        self.queue.put(update_id)
+
+    def _run(self):
+        next_recovery = time.monotonic() + self.recover_interval
+        while True:
+            try:
+                update_id = self.queue.get(timeout=max(0.0, next_recovery - time.monotonic()))
+            except Empty:
+                update_id = None
+            with self.app.app_context():
+                try:
+                    if update_id is not None:
+                        self.process(update_id)
+                    if time.monotonic() >= next_recovery:
+                        next_recovery = time.monotonic() + self.recover_interval
+                        self.recover()
+                except Exception as e:
+                    logger.error(f"Telegram update {update_id} crashed: {str(e)}", exc_info=True)
+                finally:
+                    db.session.remove()
+
+    def process(self, update_id, from_status='pending'):
+        table = TelegramUpdate.__table__
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.update_id == update_id, table.c.status == from_status)
+            .values(status='processing', claimed_at=datetime.utcnow(), attempts=table.c.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return None
+
+        update = db.session.get(TelegramUpdate, update_id)
+        try:
+            outcome = handle_telegram_update(json.loads(update.payload))
+        except Exception as e:
+            db.session.rollback()
+            update = db.session.get(TelegramUpdate, update_id)
+            update.status = 'failed' if update.attempts >= self.max_attempts else 'pending'
+            update.last_error = str(e)[:500]
+            db.session.commit()
+            if update.status == 'failed':
+                logger.error(f"Telegram update {update_id} failed permanently: {str(e)}", exc_info=True)
+            else:
+                logger.warning(f"Telegram update {update_id} failed, retrying in "
+                               f"{self.backoff(update.attempts)}s: {str(e)}")
+            return None
+
+        update.status = 'done'
+        update.processed_at = datetime.utcnow()
+        db.session.commit()
+        latency = (update.processed_at - update.received_at).total_seconds()
+        self.latency.observe(latency)
+        UPDATE_COMPLETION_LATENCY.observe(latency)
+        logger.info(f"Telegram update {update_id}: {outcome}")
+        return outcome
+
+    def backoff(self, attempts):
+        return min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+
+    def recover(self, grace=60, lease=300):
+        """Re-run updates that were never picked up, whose worker died, or whose
+        last attempt failed longer than its backoff ago. Returns how many ran."""
+        now = datetime.utcnow()
+        candidates = db.session.query(
+            TelegramUpdate.update_id, TelegramUpdate.status, TelegramUpdate.attempts,
+            TelegramUpdate.received_at, TelegramUpdate.claimed_at,
+        ).filter(TelegramUpdate.status.in_(('pending', 'processing'))).order_by(TelegramUpdate.update_id).all()
+        due = []
+        for update_id, status, attempts, received_at, claimed_at in candidates:
+            if status == 'processing':
+                ready = claimed_at < now - timedelta(seconds=lease)
+            elif attempts:
+                ready = claimed_at < now - timedelta(seconds=self.backoff(attempts))
+            else:
+                ready = received_at < now - timedelta(seconds=grace)
+            if ready:
+                due.append((update_id, status))
+        for update_id, status in due:
+            self.process(update_id, from_status=status)
+        return len(due)
+
+
+update_processor = TelegramUpdateProcessor(
+    max_attempts=int(os.getenv('TELEGRAM_UPDATE_MAX_ATTEMPTS', 5)),
+    recover_interval=int(os.getenv('TELEGRAM_UPDATE_RECOVER_INTERVAL', 15)),
+)
+# Processed updates only need keeping for as long as Telegram may redeliver them
+TELEGRAM_UPDATE_RETENTION = int(os.getenv('TELEGRAM_UPDATE_RETENTION', 24 * 3600))
+UPDATE_COMPLETION_LATENCY = metrics.register(Histogram(
+    "telegram_update_completion_seconds", "Time from webhook receipt to the update being applied."))
+
+STAFF_API_TOKEN = os.getenv('STAFF_API_TOKEN')
+
+def staff_authorized():
+    """True if the request carries ``Authorization: Bearer <STAFF_API_TOKEN>``."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return bool(STAFF_API_TOKEN) and scheme.lower() == "bearer" and hmac.compare_digest(
+        token.encode(), STAFF_API_TOKEN.encode())
+
+@bp.route("/api/reservations/bulk-status", methods=["POST"])
+def bulk_status():
+    """Accept or deny many pending reservations in one transaction (staff only).
+
+    Body: ``status`` ("Confirmed" or "Denied"), ``reservation_ids`` and/or
+    ``date`` (YYYY-MM-DD), and an optional denial ``reason``. Reservations that
+    are missing or no longer pending are reported as skipped. At most
+    BULK_MAX_RESERVATIONS change per call; ``more_pending`` says whether a date
+    still has pending reservations left over.
+    """
+    if not staff_authorized():
+        abort(401, "Staff token required")
+    try:
+        data = request.get_json(silent=True) or {}
+        status = data.get("status")
+        if status not in ("Confirmed", "Denied"):
+            abort(400, 'status must be "Confirmed" or "Denied"')
+        ids = data.get("reservation_ids")
+        if ids is not None and (not isinstance(ids, list) or not all(
+                isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            abort(400, "reservation_ids must be a list of integers")
+        if ids is not None and len(ids) > BULK_MAX_RESERVATIONS:
+            abort(400, f"At most {BULK_MAX_RESERVATIONS} reservations per request")
+        date = None
+        if data.get("date"):
+            try:
+                date = parse_date(data["date"])
+            except (ValueError, TypeError):
+                abort(400, "Invalid date format. Use YYYY-MM-DD")
+        if ids is None and date is None:
+            abort(400, "Provide reservation_ids and/or date")
+
+        reason = (data.get("reason") or "No reason provided") if status == "Denied" else None
+        changed, more = bulk_set_status(status, reservation_ids=ids, date=date, reason=reason)
+        db.session.commit()
+        if changed:
+            reservation_changed(*changed)
+
+        updated = [r.id for r in changed]
+        return jsonify({
+            "status": "success",
+            "updated": updated,
+            "skipped": sorted(set(ids) - set(updated)) if ids is not None else [],
+            "more_pending": more
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Bulk status update failed: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": "Internal server error"
+        }), 500
+
+@bp.route("/telegram-callback", methods=["POST"])
+def telegram_callback():
+    """Webhook: store the update, hand it to the background processor and ack at once.
+
+    Telegram redelivers updates it did not get a timely 200 for; those are
+    recognised by ``update_id`` and acknowledged without being applied again.
+    """
+    logger.info("Received Telegram callback")
+    try:
+        secret = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+        if secret and not hmac.compare_digest(
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret
+        ):
+            return jsonify({"status": "error", "message": "Invalid secret token"}), 403
+
+        data = request.get_json(silent=True)
+        log_payload("Callback data", data)
+        if not data or not isinstance(data.get("update_id"), int):
+            logger.error("Invalid Telegram update received")
+            return jsonify({"status": "error", "message": "Invalid update"}), 400
+
+        update_id = data["update_id"]
+        try:
+            db.session.add(TelegramUpdate(update_id=update_id, payload=json.dumps(data)))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            logger.info(f"Duplicate Telegram update {update_id}")
+            return jsonify({"status": "duplicate"}), 200
+
+        update_processor.submit(update_id)
+        return jsonify({"status": "queued"}), 200
 
     except Exception as e:
         logger.error(f"Callback error: {str(e)}", exc_info=True)
+        db.session.rollback()
         return jsonify({
             "status": "error",
             "message": "Internal server error"
         }), 500
 
-@app.route("/api/reservations/<int:reservation_id>", methods=["GET"])
+def reservation_detail(reservation):
+    return {
+        "name": reservation.name,
+        "email": reservation.email,
+        "phone": reservation.phone,
+        "date": format_date(reservation.date),
+        "time": format_time(reservation.time),
+        "diners": reservation.diners,
+        "seating": reservation.seating,
+        "pickup": reservation.pickup,
+        "status": reservation.status,
+        "denial_reason": reservation.denial_reason
+    }
+
+@bp.route("/api/reservations/<int:reservation_id>", methods=["GET"])
+@read_replica(retry_statuses=(404,))
 def get_reservation(reservation_id):
+    """Reservation details for its holder, with ETag/Last-Modified revalidation.
+
+    Responses are cached per id for a few seconds; status changes evict the
+    entry in every process (via StatusBroker) straight away. Ids not in the hot
+    table are looked up in reservation_archive.
+    """
     try:
         # Get token from query parameter
         token = request.args.get('token')
         if not token:
             abort(401, "Token is required")
 
-        reservation = Reservation.query.get_or_404(reservation_id)
-        if reservation.token != token:
+        cached = reservation_cache.get(reservation_id)
+        if cached is None:
+            reservation = (db.session.get(Reservation, reservation_id)
+                           or db.session.get(ReservationArchive, reservation_id))
+            if reservation is None:
+                abort(404)
+            cached = {
+                "token": reservation.token,
+                "data": reservation_detail(reservation),
+                "etag": f"{reservation.id}-{reservation.version}",
+                "last_modified": reservation.updated_at,
+            }
+            reservation_cache.set(reservation_id, cached)
+        if not hmac.compare_digest(cached["token"].encode(), token.encode()):
             abort(403, "Invalid token")
 
-        return jsonify({
+        response = jsonify({
             "status": "success",
-            "data": {
-                "name": reservation.name,
-                "email": reservation.email,
-                "phone": reservation.phone,
-                "date": reservation.date,
-                "time": reservation.time,
-                "diners": reservation.diners,
-                "seating": reservation.seating,
-                "pickup": reservation.pickup,
-                "status": reservation.status,
-                "denial_reason": reservation.denial_reason
-            }
+            "data": cached["data"]
         })
+        response.set_etag(cached["etag"])
+        response.last_modified = cached["last_modified"]
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Failed to get reservation: {str(e)}")
         return jsonify({
@@ -384,21 +2249,180 @@ def get_reservation(reservation_id):
             "message": "Reservation not found or invalid token"
         }), 404
 
-@app.route("/api/reservations", methods=["GET"])
+FINAL_STATUSES = ("Confirmed", "Denied")
+SSE_HEARTBEAT = int(os.getenv('SSE_HEARTBEAT', 15))
+SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', 900))
+
+def sse_message(event):
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+@bp.route("/api/reservations/<int:reservation_id>/events", methods=["GET"])
+def reservation_events(reservation_id):
+    """Server-Sent Events stream of a reservation's status.
+
+    Sends the current status straight away, then every change until the
+    reservation is Confirmed or Denied. A comment line goes out every
+    SSE_HEARTBEAT seconds to keep proxies from closing the connection, and
+    streams are closed after SSE_MAX_DURATION seconds (EventSource reconnects).
+    Each open stream holds a worker thread, so a process serves at most
+    SSE_MAX_STREAMS at once; beyond that the client gets a 503 and should poll
+    GET /api/reservations/<id> instead.
+    """
+    token = request.args.get('token')
+    if not token:
+        return jsonify({"status": "error", "message": "Token is required"}), 401
+
+    # Subscribe before reading so a change committed in between is not missed
+    subscription = status_broker.subscribe(reservation_id)
+    if subscription is None:
+        return jsonify({"status": "error", "message": "Too many open streams"}), 503, {"Retry-After": "30"}
+    try:
+        reservation = db.session.get(Reservation, reservation_id)
+        if reservation is None or not hmac.compare_digest(reservation.token.encode(), token.encode()):
+            status_broker.unsubscribe(reservation_id, subscription)
+            return jsonify({
+                "status": "error",
+                "message": "Reservation not found or invalid token"
+            }), 404
+        initial = status_event(reservation)
+    except Exception as e:
+        status_broker.unsubscribe(reservation_id, subscription)
+        logger.error(f"Failed to open status stream: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": "Internal server error"
+        }), 500
+
+    def stream():
+        try:
+            yield "retry: 5000\n"
+            yield sse_message(initial)
+            if initial["status"] in FINAL_STATUSES:
+                return
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                try:
+                    event = subscription.get(timeout=SSE_HEARTBEAT)
+                except Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield sse_message(event)
+                if event["status"] in FINAL_STATUSES:
+                    return
+        finally:
+            status_broker.unsubscribe(reservation_id, subscription)
+
+    response = Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    # Also covers clients that disconnect before the generator first runs
+    response.call_on_close(lambda: status_broker.unsubscribe(reservation_id, subscription))
+    return response
+
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 500
+LIST_COLUMNS = (
+    Reservation.id,
+    Reservation.name,
+    Reservation.date,
+    Reservation.time,
+    Reservation.diners,
+    Reservation.status,
+)
+
+def list_row(row):
+    return {
+        "id": row.id,
+        "name": row.name,
+        "date": format_date(row.date),
+        "time": format_time(row.time),
+        "diners": row.diners,
+        "status": row.status
+    }
+
+def encode_cursor(row):
+    raw = json.dumps([row.date.isoformat(), row.time.isoformat(), row.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    date, time_, reservation_id = json.loads(raw)
+    return parse_date(date), dt_time.fromisoformat(time_), int(reservation_id)
+
+def build_list_query(args):
+    """Column-only reservation query with the filters and keyset cursor from ``args``.
+
+    Raises ValueError for malformed parameters.
+    """
+    query = db.session.query(*LIST_COLUMNS)
+
+    if date_from := args.get("date_from"):
+        query = query.filter(Reservation.date >= parse_date(date_from))
+    if date_to := args.get("date_to"):
+        query = query.filter(Reservation.date <= parse_date(date_to))
+    if status := args.get("status"):
+        query = query.filter(Reservation.status.in_(status.split(",")))
+    if seating := args.get("seating"):
+        query = query.filter(Reservation.seating.in_(seating.split(",")))
+
+    if cursor := args.get("cursor"):
+        date, time_, reservation_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            Reservation.date > date,
+            db.and_(Reservation.date == date, Reservation.time > time_),
+            db.and_(Reservation.date == date, Reservation.time == time_, Reservation.id > reservation_id),
+        ))
+
+    return query.order_by(Reservation.date, Reservation.time, Reservation.id)
+
+def wants_ndjson():
+    if request.args.get("format") == "ndjson":
+        return True
+    return request.accept_mimetypes.best == "application/x-ndjson"
+
+@bp.route("/api/reservations", methods=["GET"])
+@read_replica()
 def list_reservations():
+    """List reservations ordered by (date, time, id), one keyset page at a time.
+
+    Query parameters: ``limit``, ``cursor`` (the ``next_cursor`` of the previous
+    page), ``date_from``/``date_to`` (YYYY-MM-DD), ``status`` and ``seating``
+    (comma-separated). With ``format=ndjson`` or ``Accept: application/x-ndjson``
+    every matching row is streamed from a server-side cursor instead. Archived
+    reservations are not listed; see export-archive.
+    """
     try:
-        reservations = Reservation.query.order_by(Reservation.date, Reservation.time).all()
+        try:
+            query = build_list_query(request.args)
+            limit = request.args.get("limit", type=int)
+        except (ValueError, TypeError):
+            return jsonify({
+                "status": "error",
+                "message": "Invalid filter or cursor"
+            }), 400
+
+        if wants_ndjson():
+            if limit:
+                # Clamped like the paged path: a bad LIMIT would only fail
+                # mid-stream, after the 200 has been sent
+                query = query.limit(max(1, limit))
+
+            def generate():
+                for row in query.yield_per(500):
+                    yield json.dumps(list_row(row)) + "\n"
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        limit = max(1, min(limit or LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE))
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         return jsonify({
             "status": "success",
-            "count": len(reservations),
-            "data": [{
-                "id": r.id,
-                "name": r.name,
-                "date": r.date,
-                "time": r.time,
-                "diners": r.diners,
-                "status": r.status
-            } for r in reservations]
+            "count": len(rows),
+            "data": [list_row(r) for r in rows],
+            "next_cursor": encode_cursor(rows[-1]) if has_more else None
         })
     except Exception as e:
         logger.error(f"Failed to list reservations: {str(e)}")
@@ -407,8 +2431,95 @@ def list_reservations():
             "message": "Internal server error"
         }), 500
 
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>")
+@bp.route("/api/availability", methods=["GET"])
+@read_replica()
+def availability():
+    try:
+        try:
+            date = parse_date(request.args.get("date", ""))
+        except ValueError:
+            return jsonify({
+                "status": "error",
+                "message": "Invalid date format. Use YYYY-MM-DD"
+            }), 400
+
+        slots = availability_cache.get(date)
+        if slots is None:
+            slots = get_availability(date)
+            availability_cache.set(date, slots)
+        return jsonify({
+            "status": "success",
+            "date": format_date(date),
+            "slots": slots
+        })
+    except Exception as e:
+        logger.error(f"Failed to get availability: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": "Internal server error"
+        }), 500
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the per-statement context: after_cursor_execute is skipped when a
+    # statement raises, and nothing stored on the pooled connection would be freed
+    context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    DB_QUERY_LATENCY.observe(elapsed, statement=statement.lstrip().split(" ", 1)[0].upper())
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_time = g.get("db_time", 0.0) + elapsed
+
+@bp.before_app_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@bp.after_app_request
+def _record_request_metrics(response):
+    if "request_start" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_start,
+                                method=request.method, route=route, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(g.get("db_queries", 0), route=route)
+        REQUEST_DB_TIME.observe(g.get("db_time", 0.0), route=route)
+    return response
+
+def thread_counts():
+    counts = {}
+    for thread in threading.enumerate():
+        for prefix in ("smtp-worker", "telegram-updates", "telegram", "status-listener"):
+            if thread.name.startswith(prefix):
+                counts[prefix] = counts.get(prefix, 0) + 1
+                break
+    return counts
+
+metrics.register(Gauge("notification_threads", "Live background notification threads by pool.",
+                       thread_counts, labels=("pool",)))
+metrics.register(Gauge("notification_queue_depth", "Work waiting in in-process queues.", lambda: {
+    "email": email_pool.queue.qsize(),
+    "telegram_updates": update_processor.queue.qsize(),
+}, labels=("queue",)))
+metrics.register(Gauge("in_memory_store_entries", "Entries held in in-process caches.", lambda: {
+    "telegram_message_store": len(telegram_message_store.cache),
+    "pending_denials": len(pending_denials.cache),
+    "availability": len(availability_cache),
+    "reservation": len(reservation_cache),
+}, labels=("store",)))
+metrics.register(Gauge("db_pool_connections_in_use", "Checked-out database connections by pool.", lambda: {
+    name or "primary": engine.pool.checkedout()
+    for name, engine in db.engines.items() if isinstance(engine.pool, QueuePool)
+}, labels=("pool",)))
+metrics.register(Gauge("sse_open_streams", "Open status event streams.", lambda: status_broker._count))
+
+@bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/", defaults={"path": ""})
+@bp.route("/<path:path>")
 def catch_all(path):
     return jsonify({
         "status": "error",
@@ -416,20 +2527,36 @@ def catch_all(path):
         "valid_endpoints": [
             "/api/reservations",
             "/api/reservations/<id>",
+            "/api/reservations/<id>/events",
+            "/api/reservations/bulk-status",
+            "/api/availability",
             "/telegram-callback",
+            "/metrics",
             "/test"
         ]
     }), 404
 
-@app.route("/test", methods=["GET"])
+@bp.route("/test", methods=["GET"])
 def test_endpoint():
     try:
-        db.session.execute("SELECT 1")
+        db.session.execute(db.text("SELECT 1"))
+        replica_status = "not configured"
+        if replica.url:
+            try:
+                with db.engines["replica"].connect() as conn:
+                    conn.execute(db.text("SELECT 1"))
+                replica_status = "connected"
+            except Exception as e:
+                replica_status = f"unavailable: {e}"
         return jsonify({
             "status": "running",
             "service": "Reservation System",
             "timestamp": datetime.utcnow().isoformat(),
-            "database": "connected"
+            "database": "connected",
+            "replica": replica_status,
+            "email": email_pool.stats(),
+            "telegram": telegram.latency.snapshot(),
+            "telegram_updates": update_processor.latency.snapshot()
         })
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
@@ -439,6 +2566,341 @@ def test_endpoint():
             "error": str(e)
         }), 500
 
+@bp.cli.command("init-db")
+def init_db_command():
+    """Create any missing tables."""
+    db.create_all(bind_key=None)
+    logger.info("Database tables created")
+
+@bp.cli.command("purge-state")
+def purge_state_command():
+    """Delete expired state, idempotency records, finished outbox rows and Telegram
+    updates, and idle rate-limit buckets."""
+    if isinstance(state_backend, DatabaseStateBackend):
+        logger.info(f"Purged {state_backend.purge_expired()} expired state entries")
+    cutoff = datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL)
+    purged = IdempotencyRecord.query.filter(IdempotencyRecord.created_at < cutoff).delete()
+    db.session.commit()
+    logger.info(f"Purged {purged} idempotency records")
+    cutoff = datetime.utcnow() - timedelta(seconds=OUTBOX_RETENTION)
+    purged = NotificationOutbox.query.filter(
+        NotificationOutbox.status.in_(('sent', 'failed')), NotificationOutbox.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    logger.info(f"Purged {purged} sent or failed notifications")
+    cutoff = datetime.utcnow() - timedelta(seconds=TELEGRAM_UPDATE_RETENTION)
+    purged = TelegramUpdate.query.filter(
+        TelegramUpdate.status == 'done', TelegramUpdate.received_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    logger.info(f"Purged {purged} processed Telegram updates")
+    logger.info(f"Purged {rate_limiter.purge(datetime.utcnow() - timedelta(days=1))} rate limit buckets")
+
+def migrate_reservation_types(batch_size=1000):
+    """Convert reservation.date/time from strings to DATE/TIME without a long lock.
+
+    1. Add nullable date_new/time_new and created_at/updated_at columns.
+    2. Backfill them in id-ordered batches, one short transaction each, while
+       the old code keeps serving traffic.
+    3. In one transaction: lock the table, backfill rows inserted meanwhile,
+       drop the string columns and rename the new ones into place.
+    4. Build the (date, time) and (status, date) indexes, concurrently on
+       PostgreSQL.
+
+    Also adds the ``version`` column used for ETags.
+
+    Safe to re-run; finished steps are skipped.
+    """
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    columns = {c['name']: c for c in db.inspect(engine).get_columns('reservation')}
+
+    if 'version' not in columns:
+        with engine.begin() as conn:
+            conn.execute(db.text('ALTER TABLE reservation ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+
+    if not isinstance(columns['date']['type'], db.Date):
+        with engine.begin() as conn:
+            for name, sql_type in (("date_new", "DATE"), ("time_new", "TIME"),
+                                   ("created_at", "TIMESTAMP"), ("updated_at", "TIMESTAMP")):
+                if name not in columns:
+                    conn.execute(db.text(f'ALTER TABLE reservation ADD COLUMN {name} {sql_type}'))
+
+        def backfill(conn, after_id, limit=None):
+            query = 'SELECT id, "date", "time" FROM reservation WHERE id > :after AND date_new IS NULL ORDER BY id'
+            rows = conn.execute(db.text(query + (f' LIMIT {int(limit)}' if limit else '')), {"after": after_id}).all()
+            updates, bad = [], []
+            for row in rows:
+                try:
+                    updates.append({"id": row.id, "d": parse_date(row.date), "t": parse_time(row.time)})
+                except (ValueError, TypeError, AttributeError):
+                    bad.append(row.id)
+            if updates:
+                conn.execute(db.text(
+                    'UPDATE reservation SET date_new = :d, time_new = :t, '
+                    'created_at = COALESCE(created_at, CURRENT_TIMESTAMP), '
+                    'updated_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE id = :id'
+                ).bindparams(db.bindparam("d", type_=db.Date), db.bindparam("t", type_=db.Time)), updates)
+            return (rows[-1].id if rows else None), bad
+
+        last_id, invalid = 0, []
+        while True:
+            with engine.begin() as conn:
+                last_id, bad = backfill(conn, last_id, batch_size)
+            invalid += bad
+            if last_id is None:
+                break
+            logger.info(f"Backfilled reservations up to id {last_id}")
+        if invalid:
+            raise RuntimeError(f"Reservations with unparseable date/time, fix them and re-run: {invalid}")
+
+        with engine.begin() as conn:
+            if postgres:
+                conn.execute(db.text('LOCK TABLE reservation IN ACCESS EXCLUSIVE MODE'))
+            _, bad = backfill(conn, 0)
+            if bad:
+                raise RuntimeError(f"Reservations with unparseable date/time, fix them and re-run: {bad}")
+            conn.execute(db.text('ALTER TABLE reservation DROP COLUMN "date"'))
+            conn.execute(db.text('ALTER TABLE reservation DROP COLUMN "time"'))
+            conn.execute(db.text('ALTER TABLE reservation RENAME COLUMN date_new TO "date"'))
+            conn.execute(db.text('ALTER TABLE reservation RENAME COLUMN time_new TO "time"'))
+            if postgres:
+                for name in ("date", "time", "created_at", "updated_at"):
+                    conn.execute(db.text(f'ALTER TABLE reservation ALTER COLUMN "{name}" SET NOT NULL'))
+                for name in ("created_at", "updated_at"):
+                    conn.execute(db.text(f'ALTER TABLE reservation ALTER COLUMN {name} SET DEFAULT CURRENT_TIMESTAMP'))
+        logger.info("Reservation date/time columns converted")
+
+    concurrently = "CONCURRENTLY " if postgres else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if postgres:
+            # Index builds on a large table can outlast DB_STATEMENT_TIMEOUT_MS
+            conn.execute(db.text('SET statement_timeout = 0'))
+        for index in Reservation.__table__.indexes:
+            columns_sql = ", ".join(f'"{c.name}"' for c in index.columns)
+            conn.execute(db.text(
+                f'CREATE INDEX {concurrently}IF NOT EXISTS {index.name} ON reservation ({columns_sql})'
+            ))
+    logger.info("Reservation indexes created")
+
+@bp.cli.command("migrate-reservation-types")
+@click.option("--batch-size", default=1000, show_default=True)
+def migrate_reservation_types_command(batch_size):
+    """Online migration of reservation date/time to native types."""
+    migrate_reservation_types(batch_size)
+
+@bp.cli.command("set-capacity")
+@click.option("--time", "time_", required=True, help='Slot time, e.g. "7:00 PM".')
+@click.option("--seating", required=True)
+@click.option("--capacity", required=True, type=int, help="Maximum diners for the slot.")
+@click.option("--date", default=None, help="Only for this YYYY-MM-DD; omit for every date.")
+def set_capacity_command(time_, seating, capacity, date):
+    """Configure the capacity of a time slot."""
+    date = parse_date(date) if date else None
+    slot = SlotCapacity.query.filter_by(date=date, time=parse_time(time_), seating=seating).first()
+    if slot is None:
+        slot = SlotCapacity(date=date, time=parse_time(time_), seating=seating)
+        db.session.add(slot)
+    slot.capacity = capacity
+    db.session.commit()
+    logger.info(f"Capacity for {seating} at {time_} set to {capacity}")
+
+@bp.cli.command("rebuild-occupancy")
+def rebuild_occupancy_command():
+    """Recompute slot_occupancy from the reservation table."""
+    status = db.func.coalesce(Reservation.status, "Pending")
+    rows = db.session.query(
+        Reservation.date, Reservation.time, Reservation.seating,
+        db.func.sum(db.case((status == "Pending", Reservation.diners), else_=0)),
+        db.func.sum(db.case((status == "Confirmed", Reservation.diners), else_=0)),
+    ).group_by(Reservation.date, Reservation.time, Reservation.seating).all()
+    SlotOccupancy.query.delete()
+    db.session.add_all(
+        SlotOccupancy(date=date, time=time_, seating=seating, pending=pending, confirmed=confirmed)
+        for date, time_, seating, pending, confirmed in rows
+    )
+    db.session.commit()
+    logger.info(f"Rebuilt occupancy for {len(rows)} slots")
+
+@bp.cli.command("process-telegram-updates")
+@click.option("--grace", default=60, show_default=True, help="Seconds before a pending update counts as missed.")
+def process_telegram_updates_command(grace):
+    """Apply Telegram updates the web workers did not finish."""
+    logger.info(f"Recovered {update_processor.recover(grace=grace)} Telegram updates")
+
+@bp.cli.command("dispatch-outbox")
+@click.option("--once", is_flag=True, help="Process a single batch and exit.")
+@click.option("--batch-size", default=50, show_default=True)
+@click.option("--interval", default=1.0, show_default=True, help="Seconds to sleep when the outbox is empty.")
+def dispatch_outbox_command(once, batch_size, interval):
+    """Send queued Telegram and email notifications."""
+    dispatcher = OutboxDispatcher(
+        batch_size=batch_size,
+        max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8)),
+    )
+    if once:
+        logger.info(f"Dispatched {dispatcher.run_once()} notifications")
+    else:
+        dispatcher.run_forever(interval)
+
+ARCHIVE_COLUMNS = [c.name for c in Reservation.__table__.columns]
+
+def archive_reservations(before, batch_size=500, pause=0.0):
+    """Move reservations dated before ``before`` into reservation_archive.
+
+    Works in id-ordered chunks of ``batch_size``, each copied and deleted in its
+    own short transaction, so bookings and status changes keep flowing while a
+    large backlog drains. Occupancy counters for the archived dates are dropped
+    as well. Returns the number of reservations moved.
+    """
+    hot = Reservation.__table__
+    archive = ReservationArchive.__table__
+    engine = db.engine
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            query = db.select(hot.c.id).where(hot.c.date < before).order_by(hot.c.id).limit(batch_size)
+            if engine.dialect.name == 'postgresql':
+                # Skip rows a request is updating right now; the next run gets them
+                query = query.with_for_update(skip_locked=True)
+            ids = conn.execute(query).scalars().all()
+            if not ids:
+                break
+            conn.execute(archive.insert().from_select(
+                [*ARCHIVE_COLUMNS, 'archived_at'],
+                db.select(*(hot.c[name] for name in ARCHIVE_COLUMNS), db.literal(datetime.utcnow(), db.DateTime))
+                .where(hot.c.id.in_(ids))
+            ))
+            conn.execute(hot.delete().where(hot.c.id.in_(ids)))
+        moved += len(ids)
+        logger.info(f"Archived {moved} reservations (up to id {ids[-1]})")
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    with engine.begin() as conn:
+        occupancy = SlotOccupancy.__table__
+        conn.execute(occupancy.delete().where(occupancy.c.date < before))
+    return moved
+
+def archive_row(row):
+    return {
+        name: format_time(value) if name == 'time' else value.isoformat() if hasattr(value, 'isoformat') else value
+        for name, value in row._mapping.items()
+    }
+
+def export_archive(path, fmt="ndjson", since=None, until=None):
+    """Write archived reservations (optionally a date range) to a gzip file."""
+    archive = ReservationArchive.__table__
+    query = db.select(archive).order_by(archive.c.date, archive.c.id)
+    if since is not None:
+        query = query.where(archive.c.date >= since)
+    if until is not None:
+        query = query.where(archive.c.date < until)
+
+    count = 0
+    with gzip.open(path, "wt", newline="") as out:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=[c.name for c in archive.columns])
+            writer.writeheader()
+        with db.engine.connect() as conn:
+            for row in conn.execution_options(yield_per=1000).execute(query):
+                if writer is not None:
+                    writer.writerow(archive_row(row))
+                else:
+                    out.write(json.dumps(archive_row(row)) + "\n")
+                count += 1
+    return count
+
+@bp.cli.command("archive-reservations")
+@click.option("--days", default=int(os.getenv('ARCHIVE_AFTER_DAYS', 1)), show_default=True,
+              help="Archive reservations dated at least this many days ago.")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--pause", default=0.1, show_default=True, help="Seconds to sleep between batches.")
+def archive_reservations_command(days, batch_size, pause):
+    """Move past reservations into reservation_archive (run it daily)."""
+    before = datetime.utcnow().date() - timedelta(days=days - 1)
+    logger.info(f"Archived {archive_reservations(before, batch_size, pause)} reservations dated before {before}")
+
+@bp.cli.command("export-archive")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson", show_default=True)
+@click.option("--since", default=None, help="First date to include (YYYY-MM-DD).")
+@click.option("--until", default=None, help="Date to stop before (YYYY-MM-DD).")
+def export_archive_command(path, fmt, since, until):
+    """Export archived reservations to a gzip-compressed NDJSON or CSV file."""
+    count = export_archive(path, fmt, since and parse_date(since), until and parse_date(until))
+    logger.info(f"Exported {count} archived reservations to {path}")
+
+def create_app(config=None):
+    """Build the Flask app from the environment plus ``config`` overrides.
+
+    Nothing here opens a connection or starts a thread: engines, HTTP pools and
+    worker threads are created on first use, so the app can be built once in a
+    gunicorn master (``preload_app``) and shared by forked workers. The
+    module-level services bind to the most recently created app.
+    """
+    configure_logging()
+    app = Flask(__name__)
+    app.config.from_mapping(config_from_env())
+    app.config.update(config or {})
+
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          engine_options(app.config['SQLALCHEMY_DATABASE_URI'], "primary"))
+    replica.url = app.config['DATABASE_REPLICA_URL']
+    if replica.url:
+        app.config.setdefault('SQLALCHEMY_BINDS', {
+            "replica": {"url": replica.url, **engine_options(replica.url, "replica")}
+        })
+
+    CORS(app)
+    if IP_RATE_LIMIT and not (app.config['PROXY_FIX_X_FOR'] or RATE_LIMIT_IP_DIRECT):
+        logger.info("Per-IP rate limit is off: set PROXY_FIX_X_FOR behind a proxy, "
+                    "or RATE_LIMIT_IP_DIRECT=true if clients connect directly")
+    if proxies := app.config['PROXY_FIX_X_FOR']:
+        # Behind a load balancer: take the client address from X-Forwarded-For
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies)
+    db.init_app(app)
+    for service in (email_pool, status_broker, rate_limiter, update_processor):
+        service.init_app(app)
+    if isinstance(state_backend, DatabaseStateBackend):
+        state_backend.init_app(app)
+    app.register_blueprint(bp)
+    return app
+
+def warm_up(app):
+    """Open a database connection per engine and the Telegram HTTP connection,
+    so a new worker's first requests don't pay for them, and start the status
+    listener that keeps this worker's caches current and the Telegram update
+    thread that retries failed updates. SMTP workers are left to
+    dispatch-outbox, the only process that sends email.
+
+    Called by gunicorn after fork (see gunicorn.conf.py); failures are logged
+    and left to the normal lazy paths.
+    """
+    start = time.perf_counter()
+    with app.app_context():
+        for name, engine in db.engines.items():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(db.text("SELECT 1"))
+            except Exception as e:
+                logger.warning(f"Warm-up: {name or 'primary'} database unavailable: {str(e)}")
+    if telegram_bot_token:
+        try:
+            telegram.call("getMe", {}, retries=0)
+        except Exception as e:
+            logger.warning(f"Warm-up: Telegram unavailable: {str(e)}")
+    # Listen for status changes from the start, so cache evictions reach this worker
+    status_broker.start()
+    # Retries and recovery of updates other workers left behind run on this thread
+    update_processor.start()
+    logger.info(f"Worker warmed up in {time.perf_counter() - start:.3f}s")
+
+
+app = create_app()
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Compare two bench.run reports.
+
+    python -m bench.compare before.json after.json [--threshold 10]
+
+Prints per-endpoint throughput and p50/p95/p99 changes, and exits with
+status 1 if any endpoint's p95 got slower by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("throughput", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before, after):
+    if not before:
+        return None
+    return 100.0 * (after - before) / before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 slowdown in percent.")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)["endpoints"]
+    with open(args.after) as f:
+        after = json.load(f)["endpoints"]
+
+    regressions = []
+    print(f"{'endpoint':<42}" + "".join(f"{m:>22}" for m in METRICS))
+    for label in sorted(set(before) | set(after)):
+        if label not in before or label not in after:
+            print(f"{label:<42} only in {'after' if label in after else 'before'}")
+            continue
+        cells = []
+        for metric in METRICS:
+            delta = change(before[label][metric], after[label][metric])
+            cell = f"{before[label][metric]}→{after[label][metric]}"
+            cells.append(f"{cell} ({delta:+.0f}%)" if delta is not None else cell)
+        print(f"{label:<42}" + "".join(f"{c:>22}" for c in cells))
+        delta = change(before[label]["p95_ms"], after[label]["p95_ms"])
+        if delta is not None and delta > args.threshold:
+            regressions.append(label)
+
+    if regressions:
+        print(f"\np95 regressions over {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
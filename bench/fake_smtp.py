@@ -0,0 +1,77 @@
+"""Local SMTP sink.
+
+Speaks enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for
+smtplib, discards the messages and counts them. Each message is accepted
+after an optional delay, and a configurable share of them is rejected with
+a 451 so the outbox retry path gets exercised.
+"""
+import random
+import socketserver
+import threading
+import time
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__((host, port), FakeSMTPHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.rejected = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True).start()
+        return self
+
+    def accept_message(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if self.random.random() < self.error_rate:
+                self.rejected += 1
+                return False
+            self.messages += 1
+            return True
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 fake-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250-fake-smtp")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif command == "AUTH":
+                self.reply("235 Authentication successful")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline().rstrip(b"\r\n") != b".":
+                    pass
+                if self.server.accept_message():
+                    self.reply("250 OK queued")
+                else:
+                    self.reply("451 Temporary failure")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
@@ -0,0 +1,77 @@
+"""Local stand-in for the Telegram Bot API.
+
+Answers ``POST /bot<token>/<method>`` like the real API would for the
+methods app.py uses, after an optional delay. A configurable share of calls
+fail with 429 (``retry_after``) or 500 so retry paths get exercised.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 rate_limit_rate=0.0, error_rate=0.0, retry_after=1, seed=None):
+        super().__init__((host, port), FakeTelegramHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.message_id = 0
+        self.calls = {}
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-telegram", daemon=True).start()
+        return self
+
+    def next_response(self, method):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            roll = self.random.random()
+            if roll < self.rate_limit_rate:
+                return 429, {
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            if roll < self.rate_limit_rate + self.error_rate:
+                return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+            self.message_id += 1
+            message_id = self.message_id
+        if method == "answerCallbackQuery":
+            return 200, {"ok": True, "result": True}
+        return 200, {"ok": True, "result": {"message_id": message_id, "date": int(time.time())}}
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        method = self.path.rsplit("/", 1)[-1]
+        server = self.server
+        delay = server.latency + server.random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        status, body = server.next_response(method)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
@@ -0,0 +1,359 @@
+"""Load test for app.py against local Telegram and SMTP stand-ins.
+
+Starts the fake Bot API and SMTP servers, points the app at them (and at a
+throwaway SQLite database unless --database-url is given), serves it on a
+local port with the outbox dispatcher running alongside, then drives a
+weighted mix of requests from several client threads. Prints a JSON report
+with throughput and latency percentiles per endpoint; save it with --output
+and diff two runs with ``python -m bench.compare``.
+
+    python -m bench.run --duration 30 --concurrency 8 --output before.json
+    python -m bench.run --database-url postgresql:///reservations_bench --reset
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+import requests
+
+from bench.fake_smtp import FakeSMTPServer
+from bench.fake_telegram import FakeTelegramServer
+
+DEFAULT_MIX = "create=30,accept=10,deny=5,list=25,get=25,availability=5"
+SEATINGS = ("Inside", "Outside", "Bar")
+TIMES = ("5:00 PM", "5:30 PM", "6:00 PM", "6:30 PM", "7:00 PM", "7:30 PM", "8:00 PM", "8:30 PM")
+
+
+def parse_mix(text):
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.enabled = False
+
+    def record(self, label, seconds, ok):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples.setdefault(label, []).append((seconds, ok))
+
+    def summary(self, elapsed):
+        report = {}
+        for label, samples in sorted(self.samples.items()):
+            latencies = sorted(s for s, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            report[label] = {
+                "count": len(samples),
+                "errors": errors,
+                "throughput": round(len(samples) / elapsed, 2),
+                "mean_ms": round(1000 * sum(latencies) / len(latencies), 2),
+                "p50_ms": round(1000 * percentile(latencies, 0.50), 2),
+                "p95_ms": round(1000 * percentile(latencies, 0.95), 2),
+                "p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+                "max_ms": round(1000 * latencies[-1], 2),
+            }
+        return report
+
+
+class Workload:
+    """Shared state of the simulated clients: created reservations and update ids."""
+
+    def __init__(self, base_url, module, recorder, seed):
+        self.base_url = base_url
+        self.module = module
+        self.recorder = recorder
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.known = []
+        self.update_id = 0
+
+    def next_update_id(self):
+        with self.lock:
+            self.update_id += 1
+            return self.update_id
+
+    def timed(self, session, label, method, path, expected, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, timeout=30, **kwargs)
+            ok = response.status_code in expected
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(label, time.perf_counter() - start, ok)
+        return response
+
+    def token_for(self, reservation_id):
+        with self.module.app.app_context():
+            reservation = self.module.db.session.get(self.module.Reservation, reservation_id)
+            return reservation.token if reservation else None
+
+
+def op_create(workload, session, rng, chat_id):
+    payload = {
+        "name": f"Bench Guest {rng.randint(1, 10 ** 6)}",
+        "email": f"guest{rng.randint(1, 10 ** 6)}@example.com",
+        "phone": f"+1555{rng.randint(1000000, 9999999)}",
+        "date": (date.today() + timedelta(days=rng.randint(1, 30))).isoformat(),
+        "time": rng.choice(TIMES),
+        "diners": rng.randint(1, 8),
+        "seating": rng.choice(SEATINGS),
+        "pickup": rng.choice(("Yes", "No")),
+    }
+    response = workload.timed(session, "POST /api/reservations", "POST", "/api/reservations",
+                              (201,), json=payload)
+    if response is not None and response.status_code == 201:
+        reservation_id = response.json()["reservation_id"]
+        token = workload.token_for(reservation_id)
+        with workload.lock:
+            workload.pending.append(reservation_id)
+            workload.known.append((reservation_id, token))
+
+
+def take_pending(workload):
+    with workload.lock:
+        return workload.pending.popleft() if workload.pending else None
+
+
+def callback_update(workload, action, reservation_id, chat_id):
+    update_id = workload.next_update_id()
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "data": f"{action}_{reservation_id}",
+            "message": {"message_id": reservation_id, "text": "New Reservation Request", "chat": {"id": chat_id}},
+        },
+    }
+
+
+def op_accept(workload, session, rng, chat_id):
+    reservation_id = take_pending(workload)
+    if reservation_id is None:
+        return op_create(workload, session, rng, chat_id)
+    workload.timed(session, "POST /telegram-callback (accept)", "POST", "/telegram-callback", (200,),
+                   json=callback_update(workload, "accept", reservation_id, chat_id))
+
+
+def op_deny(workload, session, rng, chat_id):
+    reservation_id = take_pending(workload)
+    if reservation_id is None:
+        return op_create(workload, session, rng, chat_id)
+    workload.timed(session, "POST /telegram-callback (deny)", "POST", "/telegram-callback", (200,),
+                   json=callback_update(workload, "deny", reservation_id, chat_id))
+    reply = {
+        "update_id": workload.next_update_id(),
+        "message": {
+            "text": "Fully booked",
+            "chat": {"id": chat_id},
+            "reply_to_message": {"text": "🔄 Processing Denial\nNew Reservation Request"},
+        },
+    }
+    workload.timed(session, "POST /telegram-callback (denial reason)", "POST", "/telegram-callback",
+                   (200,), json=reply)
+
+
+def op_list(workload, session, rng, chat_id):
+    params = {"limit": 50}
+    if rng.random() < 0.5:
+        params["date_from"] = (date.today() + timedelta(days=rng.randint(0, 20))).isoformat()
+    workload.timed(session, "GET /api/reservations", "GET", "/api/reservations", (200,), params=params)
+
+
+def op_get(workload, session, rng, chat_id):
+    with workload.lock:
+        known = rng.choice(workload.known) if workload.known else None
+    if known is None:
+        return op_create(workload, session, rng, chat_id)
+    reservation_id, token = known
+    workload.timed(session, "GET /api/reservations/<id>", "GET", f"/api/reservations/{reservation_id}",
+                   (200, 304), params={"token": token})
+
+
+def op_availability(workload, session, rng, chat_id):
+    day = (date.today() + timedelta(days=rng.randint(1, 30))).isoformat()
+    workload.timed(session, "GET /api/availability", "GET", "/api/availability", (200,), params={"date": day})
+
+
+OPERATIONS = {
+    "create": op_create,
+    "accept": op_accept,
+    "deny": op_deny,
+    "list": op_list,
+    "get": op_get,
+    "availability": op_availability,
+}
+
+
+def client(workload, mix, deadline, index):
+    rng = random.Random(f"{workload.seed}-{index}")
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    chat_id = 10_000 + index  # one staff chat per client keeps pending denials apart
+    with requests.Session() as session:
+        while time.monotonic() < deadline:
+            OPERATIONS[rng.choices(names, weights)[0]](workload, session, rng, chat_id)
+
+
+def wait_for_drain(module, timeout):
+    """Wait until the outbox and Telegram update backlog are empty; returns seconds waited or None."""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        with module.app.app_context():
+            outbox = module.NotificationOutbox.query.filter(
+                module.NotificationOutbox.status.in_(["pending", "processing"])).count()
+            updates = module.TelegramUpdate.query.filter(
+                module.TelegramUpdate.status.in_(["pending", "processing"])).count()
+        if not outbox and not updates:
+            return round(time.monotonic() - start, 2)
+        time.sleep(0.1)
+    return None
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=2, help="Unrecorded seconds before measuring.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads.")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"Weighted operations ({DEFAULT_MIX}).")
+    parser.add_argument("--seed", default="lacasita")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file.")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first.")
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    parser.add_argument("--telegram-jitter", type=float, default=0.02)
+    parser.add_argument("--telegram-429-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--telegram-chat-rate", type=float, default=1000,
+                        help="Per-chat send rate; Telegram's real limit is 1/s.")
+    parser.add_argument("--smtp-latency", type=float, default=0.05)
+    parser.add_argument("--smtp-error-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = args.mix
+
+    telegram = FakeTelegramServer(latency=args.telegram_latency, jitter=args.telegram_jitter,
+                                  rate_limit_rate=args.telegram_429_rate,
+                                  error_rate=args.telegram_error_rate, seed=args.seed).start()
+    smtp = FakeSMTPServer(latency=args.smtp_latency, error_rate=args.smtp_error_rate, seed=args.seed).start()
+
+    workdir = tempfile.mkdtemp(prefix="lacasita-bench-")
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/bench.db",
+        "TELEGRAM_API_URL": telegram.url,
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": "10000",
+        "TELEGRAM_CHAT_RATE": str(args.telegram_chat_rate),
+        "MAIL_SERVER": "127.0.0.1",
+        "MAIL_PORT": str(smtp.port),
+        "MAIL_USE_TLS": "false",
+        "MAIL_USERNAME": "bench",
+        "MAIL_PASSWORD": "bench",
+    })
+
+    import app as module  # configured from the environment at import time
+    from werkzeug.serving import make_server
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with module.app.app_context():
+        if args.reset:
+            module.db.drop_all()
+        module.db.create_all()
+        dialect = module.db.engine.dialect.name
+
+    server = make_server("127.0.0.1", 0, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+
+    def dispatch():
+        with module.app.app_context():
+            module.OutboxDispatcher().run_forever(interval=0.05)
+
+    threading.Thread(target=dispatch, name="bench-dispatcher", daemon=True).start()
+
+    recorder = Recorder()
+    workload = Workload(f"http://127.0.0.1:{server.server_port}", module, recorder, args.seed)
+    start = time.monotonic()
+    measure_from = start + args.warmup
+    deadline = measure_from + args.duration
+    clients = [threading.Thread(target=client, args=(workload, mix, deadline, i), daemon=True)
+               for i in range(args.concurrency)]
+    for thread in clients:
+        thread.start()
+    time.sleep(max(0.0, measure_from - time.monotonic()))
+    recorder.enabled = True
+    for thread in clients:
+        thread.join()
+    recorder.enabled = False
+    elapsed = time.monotonic() - measure_from
+
+    drain_seconds = wait_for_drain(module, args.drain_timeout)
+    report = {
+        "revision": git_revision(),
+        "config": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "mix": dict(mix),
+            "database": dialect,
+            "telegram_latency": args.telegram_latency,
+            "smtp_latency": args.smtp_latency,
+            "seed": args.seed,
+        },
+        "elapsed": round(elapsed, 2),
+        "endpoints": recorder.summary(elapsed),
+        "background": {
+            "drain_seconds": drain_seconds,
+            "telegram_calls": telegram.calls,
+            "emails_sent": smtp.messages,
+            "smtp_connections": smtp.connections,
+            "telegram_update_latency": module.update_processor.latency.snapshot(),
+            "email_send_latency": module.email_pool.latency.snapshot(),
+        },
+    }
+    server.shutdown()
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
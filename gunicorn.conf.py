@@ -0,0 +1,44 @@
+# Gunicorn settings for the reservation API: gunicorn app:app
+#
+# The app is imported once in the master (preload_app) and forked, so workers
+# share its memory copy-on-write. Database and Telegram HTTP connections are only
+# opened in each worker after the fork, then warmed up before it takes traffic.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8080)}"
+preload_app = True
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+# Threads let requests overlap slow database and Telegram calls. Each open SSE
+# stream holds one thread for its whole life, so app.py caps streams per worker
+# (SSE_MAX_STREAMS, a quarter of GUNICORN_THREADS by default).
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 20
+keepalive = 5
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+accesslog = "-"
+
+
+def when_ready(server):
+    # Move everything allocated while importing the app out of the collector's
+    # reach, so collections in the workers don't touch (and copy) those pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as application
+
+    # Never reuse connections inherited from the master across processes
+    with application.app.app_context():
+        for engine in application.db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    import app as application
+
+    application.warm_up(application.app)
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+import pytest
+
+# app.py reads its settings from the environment at import time
+_workdir = tempfile.mkdtemp(prefix="lacasita-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_workdir}/test.db",
+    "TELEGRAM_BOT_TOKEN": "test",
+    "TELEGRAM_CHAT_ID": "1000",
+    "STATE_BACKEND": "memory",
+})
+
+import app as application  # noqa: E402
+
+
+@pytest.fixture
+def app_module():
+    with application.app.app_context():
+        application.db.drop_all(bind_key=None)
+        application.db.create_all(bind_key=None)
+        application.reservation_cache.clear()
+        application.availability_cache.clear()
+        yield application
+        application.db.session.remove()
+
+
+@pytest.fixture
+def telegram_calls(app_module, monkeypatch):
+    calls = []
+
+    def call(method, payload, timeout=None, retries=None):
+        calls.append((method, payload))
+        return {"message_id": len(calls)}
+
+    monkeypatch.setattr(app_module.telegram, "call", call)
+    return calls
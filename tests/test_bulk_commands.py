@@ -0,0 +1,106 @@
+import uuid
+from datetime import date, time
+
+import pytest
+
+STAFF_CHAT = 1000
+
+
+def add_reservation(app_module, day, status="Pending"):
+    reservation = app_module.Reservation(
+        name="Ana", email="ana@example.com", phone="1", date=day, time=time(19, 0),
+        diners=2, seating="Inside", pickup="No", status=status, token=str(uuid.uuid4()),
+    )
+    app_module.db.session.add(reservation)
+    app_module.db.session.commit()
+    return reservation.id
+
+
+def command(text, chat_id=STAFF_CHAT):
+    return {"message": {"message_id": 7, "chat": {"id": chat_id}, "text": text}}
+
+
+def statuses(app_module):
+    return [r.status for r in app_module.Reservation.query.order_by(app_module.Reservation.id)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("/acceptall 2030-01-02", ("/acceptall", date(2030, 1, 2), "")),
+    ("/acceptall@LaCasitaBot 2030-01-02", ("/acceptall", date(2030, 1, 2), "")),
+    ("/denyall 2030-01-02 Kitchen closed", ("/denyall", date(2030, 1, 2), "Kitchen closed")),
+    ("/acceptalll 2030-01-02", ("/acceptalll", date(2030, 1, 2), "")),
+    ("/acceptall tomorrow", ("/acceptall", None, "")),
+    ("/acceptall", ("/acceptall", None, "")),
+])
+def test_parse_bulk_command(app_module, text, expected):
+    assert app_module.parse_bulk_command(text) == expected
+
+
+@pytest.mark.parametrize("text", ["/acceptalll 2030-01-02", "/denyallx 2030-01-02", "/acceptall 02/01/2030"])
+def test_unknown_or_malformed_command_changes_nothing(app_module, telegram_calls, text):
+    add_reservation(app_module, date(2030, 1, 2))
+
+    assert app_module.handle_telegram_update(command(text)) == "invalid"
+
+    assert statuses(app_module) == ["Pending"]
+    assert app_module.NotificationOutbox.query.count() == 0
+    assert telegram_calls[-1][1]["text"] == app_module.BULK_COMMAND_USAGE
+
+
+def test_acceptall_confirms_pending_reservations_on_date(app_module, telegram_calls):
+    add_reservation(app_module, date(2030, 1, 2))
+    add_reservation(app_module, date(2030, 1, 2), status="Denied")
+    add_reservation(app_module, date(2030, 1, 3))
+
+    assert app_module.handle_telegram_update(command("/acceptall 2030-01-02")) == "bulk_confirmed"
+
+    assert statuses(app_module) == ["Confirmed", "Denied", "Pending"]
+    kinds = sorted(o.kind for o in app_module.NotificationOutbox.query)
+    assert kinds == ["email", "telegram_edit"]
+
+
+def test_denyall_uses_reason(app_module, telegram_calls):
+    add_reservation(app_module, date(2030, 1, 2))
+
+    assert app_module.handle_telegram_update(command("/denyall 2030-01-02 Private event")) == "bulk_denied"
+
+    reservation = app_module.Reservation.query.one()
+    assert (reservation.status, reservation.denial_reason) == ("Denied", "Private event")
+
+
+def test_bulk_command_from_other_chat_is_ignored(app_module, telegram_calls):
+    add_reservation(app_module, date(2030, 1, 2))
+
+    assert app_module.handle_telegram_update(command("/acceptall 2030-01-02", chat_id=5)) == "ignored"
+
+    assert statuses(app_module) == ["Pending"]
+    assert telegram_calls == []
+
+
+def test_acceptall_reports_leftover_reservations(app_module, telegram_calls, monkeypatch):
+    monkeypatch.setattr(app_module, "BULK_MAX_RESERVATIONS", 1)
+    add_reservation(app_module, date(2030, 1, 2))
+    add_reservation(app_module, date(2030, 1, 2), status=None)
+
+    app_module.handle_telegram_update(command("/acceptall 2030-01-02"))
+
+    assert statuses(app_module) == ["Confirmed", "Pending"]
+    assert "still pending" in telegram_calls[-1][1]["text"]
+
+
+def test_bulk_status_endpoint(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "STAFF_API_TOKEN", "staff")
+    monkeypatch.setattr(app_module, "BULK_MAX_RESERVATIONS", 2)
+    ids = [add_reservation(app_module, date(2030, 1, 2)) for _ in range(3)]
+    client = app_module.app.test_client()
+    headers = {"Authorization": "Bearer staff"}
+
+    assert client.post("/api/reservations/bulk-status", json={
+        "status": "Confirmed", "reservation_ids": ids}).status_code == 401
+    assert client.post("/api/reservations/bulk-status", json={
+        "status": "Confirmed", "reservation_ids": [True, False]}, headers=headers).status_code == 400
+
+    response = client.post("/api/reservations/bulk-status", json={
+        "status": "Confirmed", "date": "2030-01-02"}, headers=headers)
+    assert response.json["updated"] == ids[:2]
+    assert response.json["more_pending"] is True
@@ -0,0 +1,34 @@
+import json
+import uuid
+from datetime import date, time
+
+import pytest
+
+
+@pytest.fixture
+def client(app_module):
+    for day in (2, 3, 4):
+        app_module.db.session.add(app_module.Reservation(
+            name="Ana", email="ana@example.com", phone="1", date=date(2030, 1, day), time=time(19, 0),
+            diners=2, seating="Inside", pickup="No", token=str(uuid.uuid4()),
+        ))
+    app_module.db.session.commit()
+    return app_module.app.test_client()
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize("limit, expected", [(None, 3), (2, 2), (-1, 1), (0, 3)])
+def test_ndjson_limit(client, limit, expected):
+    query = {"format": "ndjson"} if limit is None else {"format": "ndjson", "limit": limit}
+    response = client.get("/api/reservations", query_string=query)
+    assert response.status_code == 200
+    assert len(ndjson(response)) == expected
+
+
+@pytest.mark.parametrize("limit, expected", [(-1, 1), (2, 2), (None, 3)])
+def test_paged_limit(client, limit, expected):
+    query = {} if limit is None else {"limit": limit}
+    assert client.get("/api/reservations", query_string=query).json["count"] == expected
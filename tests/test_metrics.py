@@ -0,0 +1,13 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+
+def test_failed_statements_leave_nothing_on_the_connection(app_module):
+    db = app_module.db
+    with db.engine.connect() as conn:
+        conn.execute(app_module.TelegramUpdate.__table__.insert().values(update_id=1, payload="{}"))
+        for _ in range(3):
+            with pytest.raises(IntegrityError):
+                conn.execute(app_module.TelegramUpdate.__table__.insert().values(update_id=1, payload="{}"))
+        assert "query_start" not in conn.info
+        conn.execute(db.text("SELECT 1"))
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+
+def test_purge_state_drops_old_finished_notifications(app_module):
+    Outbox = app_module.NotificationOutbox
+    old = datetime.utcnow() - timedelta(seconds=app_module.OUTBOX_RETENTION + 60)
+    for status, created_at in [("sent", old), ("failed", old), ("pending", old), ("sent", datetime.utcnow())]:
+        app_module.db.session.add(Outbox(kind="email", payload="{}", status=status, created_at=created_at))
+    app_module.db.session.commit()
+
+    result = app_module.app.test_cli_runner().invoke(args=["purge-state"])
+
+    assert result.exit_code == 0, result.output
+    assert sorted((o.status, o.created_at == old) for o in Outbox.query) == [("pending", True), ("sent", False)]
+
+
+def test_purge_state_drops_old_processed_telegram_updates(app_module):
+    Update = app_module.TelegramUpdate
+    old = datetime.utcnow() - timedelta(seconds=app_module.TELEGRAM_UPDATE_RETENTION + 60)
+    for update_id, status, received_at in [(1, "done", old), (2, "failed", old), (3, "done", datetime.utcnow())]:
+        app_module.db.session.add(Update(update_id=update_id, payload="{}", status=status, received_at=received_at))
+    app_module.db.session.commit()
+
+    result = app_module.app.test_cli_runner().invoke(args=["purge-state"])
+
+    assert result.exit_code == 0, result.output
+    assert sorted(u.update_id for u in Update.query) == [2, 3]
@@ -0,0 +1,56 @@
+import uuid
+from datetime import date, time
+
+
+def test_status_change_from_another_worker_evicts_cached_reservation(app_module):
+    reservation = app_module.Reservation(
+        name="Ana", email="ana@example.com", phone="1", date=date(2030, 1, 2), time=time(19, 0),
+        diners=2, seating="Inside", pickup="No", token=str(uuid.uuid4()),
+    )
+    app_module.db.session.add(reservation)
+    app_module.db.session.commit()
+    url = f"/api/reservations/{reservation.id}?token={reservation.token}"
+    client = app_module.app.test_client()
+
+    first = client.get(url)
+    assert first.json["data"]["status"] == "Pending"
+
+    # Another worker confirms it and its NOTIFY reaches this process
+    table = app_module.Reservation.__table__
+    app_module.db.session.execute(table.update().where(table.c.id == reservation.id)
+                                  .values(status="Confirmed", version=table.c.version + 1))
+    app_module.db.session.commit()
+    app_module.status_broker._deliver({"reservation_id": reservation.id, "status": "Confirmed",
+                                       "denial_reason": None})
+
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.json["data"]["status"] == "Confirmed"
+
+
+def test_cached_reservation_still_checks_the_token(app_module):
+    reservation = app_module.Reservation(
+        name="Ana", email="ana@example.com", phone="1", date=date(2030, 1, 2), time=time(19, 0),
+        diners=2, seating="Inside", pickup="No", token=str(uuid.uuid4()),
+    )
+    app_module.db.session.add(reservation)
+    app_module.db.session.commit()
+    client = app_module.app.test_client()
+
+    assert client.get(f"/api/reservations/{reservation.id}?token={reservation.token}").status_code == 200
+    assert client.get(f"/api/reservations/{reservation.id}?token=wrong").status_code == 404
+
+
+def test_status_change_from_another_worker_evicts_cached_availability(app_module):
+    reservation = app_module.Reservation(
+        name="Ana", email="ana@example.com", phone="1", date=date(2030, 1, 2), time=time(19, 0),
+        diners=2, seating="Inside", pickup="No", token=str(uuid.uuid4()),
+    )
+    app_module.db.session.add(reservation)
+    app_module.db.session.commit()
+    app_module.availability_cache.set(reservation.date, ["stale"])
+
+    # Another worker's NOTIFY carries the same event this worker would publish
+    app_module.status_broker._deliver(app_module.status_event(reservation))
+
+    assert app_module.availability_cache.get(reservation.date) is None
@@ -0,0 +1,86 @@
+import pytest
+
+
+def booking(**overrides):
+    return {
+        "name": "Ana", "email": "ana@example.com", "phone": "1", "date": "2030-01-02",
+        "time": "7:00 PM", "diners": 2, "seating": "Inside", "pickup": "No", **overrides,
+    }
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def test_ip_limit_is_off_without_a_trusted_client_address(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "IP_RATE_LIMIT", (1, 60))
+
+    for i in range(3):
+        assert client.post("/api/reservations", json=booking(email=f"{i}@example.com")).status_code == 201
+
+
+def test_ip_limit_applies_to_new_bookings(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "IP_RATE_LIMIT", (1, 60))
+    monkeypatch.setattr(app_module, "RATE_LIMIT_IP_DIRECT", True)
+
+    assert client.post("/api/reservations", json=booking(email="a@example.com")).status_code == 201
+    response = client.post("/api/reservations", json=booking(email="b@example.com"))
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_retry_is_replayed_even_when_over_the_ip_limit(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "IP_RATE_LIMIT", (1, 60))
+    monkeypatch.setattr(app_module, "RATE_LIMIT_IP_DIRECT", True)
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = client.post("/api/reservations", json=booking(), headers=headers)
+    retry = client.post("/api/reservations", json=booking(), headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json["reservation_id"] == first.json["reservation_id"]
+    assert app_module.Reservation.query.count() == 1
+
+
+def test_reused_idempotency_key_with_other_body_is_rejected(app_module, client):
+    headers = {"Idempotency-Key": "retry-2"}
+    assert client.post("/api/reservations", json=booking(), headers=headers).status_code == 201
+    assert client.post("/api/reservations", json=booking(diners=4), headers=headers).status_code == 422
+
+
+def commit_concurrent_booking_first(app_module, monkeypatch, **body):
+    """Make a racing request, with the given body, commit its booking just
+    after this request's replay checks have come up empty."""
+    original = app_module.parse_date
+    racer = app_module.app.test_client()
+
+    def parse_date(value):
+        monkeypatch.setattr(app_module, "parse_date", original)
+        with app_module.app.app_context():
+            assert racer.post("/api/reservations", json=booking(**body),
+                              headers={"Idempotency-Key": "racer"}).status_code == 201
+        return original(value)
+
+    monkeypatch.setattr(app_module, "parse_date", parse_date)
+
+
+def test_lost_race_on_content_key_replays_with_fresh_idempotency_key(app_module, client, monkeypatch):
+    commit_concurrent_booking_first(app_module, monkeypatch)
+
+    response = client.post("/api/reservations", json=booking(), headers={"Idempotency-Key": "tap-2"})
+
+    assert response.status_code == 201
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert app_module.Reservation.query.count() == 1
+
+
+def test_lost_race_on_near_identical_content_replays_without_422(app_module, client, monkeypatch):
+    commit_concurrent_booking_first(app_module, monkeypatch, email="ANA@example.com ")
+
+    response = client.post("/api/reservations", json=booking())
+
+    assert response.status_code == 201
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert app_module.Reservation.query.count() == 1
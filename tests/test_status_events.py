@@ -0,0 +1,27 @@
+import uuid
+from datetime import date, time
+
+
+def test_streams_beyond_the_cap_are_refused(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.status_broker, "max_streams", 1)
+    reservation = app_module.Reservation(
+        name="Ana", email="ana@example.com", phone="1", date=date(2030, 1, 2), time=time(19, 0),
+        diners=2, seating="Inside", pickup="No", token=str(uuid.uuid4()),
+    )
+    app_module.db.session.add(reservation)
+    app_module.db.session.commit()
+    url = f"/api/reservations/{reservation.id}/events?token={reservation.token}"
+    client = app_module.app.test_client()
+
+    first = client.get(url, buffered=False)
+    try:
+        second = client.get(url)
+        assert second.status_code == 503
+        assert second.headers["Retry-After"] == "30"
+    finally:
+        first.close()
+    assert app_module.status_broker._count == 0
+
+
+def test_default_stream_cap_leaves_threads_free(app_module):
+    assert 1 <= app_module.SSE_MAX_STREAMS <= 8 // 4
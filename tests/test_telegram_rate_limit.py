@@ -0,0 +1,26 @@
+def test_clients_in_different_processes_share_the_bot_budget(app_module):
+    # Two clients stand in for two workers sending through the same bot
+    first, second = (app_module.TelegramClient("test", global_rate=1, chat_rate=1, shared_buckets=True)
+                     for _ in range(2))
+
+    assert first.global_bucket.reserve() == 0
+    assert second.global_bucket.reserve() > 0.9
+
+
+def test_429_pauses_the_chat_for_every_process(app_module):
+    first, second = (app_module.TelegramClient("test", chat_rate=1, shared_buckets=True) for _ in range(2))
+
+    first._chat_bucket(1000).pause(10)
+
+    assert second._chat_bucket(1000).reserve() > 9
+
+
+def test_concurrent_first_sends_create_the_shared_bucket_once(app_module):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(4) as pool:
+        delays = list(pool.map(lambda _: app_module.rate_limiter.reserve("telegram:global", 1, 4), range(4)))
+
+    # The senders that lose the race to insert the row retry instead of failing
+    assert delays == [0, 0, 0, 0]
+    assert app_module.RateLimitBucket.query.filter_by(key="telegram:global").count() == 1
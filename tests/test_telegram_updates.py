@@ -0,0 +1,72 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+
+def store_update(app_module, update_id):
+    app_module.db.session.add(app_module.TelegramUpdate(update_id=update_id, payload=json.dumps({"update_id": update_id})))
+    app_module.db.session.commit()
+
+
+def age(app_module, update_id, seconds):
+    update = app_module.db.session.get(app_module.TelegramUpdate, update_id)
+    update.claimed_at = datetime.utcnow() - timedelta(seconds=seconds)
+    update.received_at = update.claimed_at
+    app_module.db.session.commit()
+
+
+def test_failed_update_is_retried_after_backoff(app_module, monkeypatch):
+    outcomes = iter([RuntimeError("database blip"), "confirmed"])
+
+    def handle(data):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(app_module, "handle_telegram_update", handle)
+    processor = app_module.TelegramUpdateProcessor(max_attempts=3, base_backoff=5)
+    store_update(app_module, 1)
+
+    assert processor.process(1) is None
+    assert processor.recover() == 0  # still backing off
+
+    age(app_module, 1, 6)
+    assert processor.recover() == 1
+    update = app_module.db.session.get(app_module.TelegramUpdate, 1)
+    assert (update.status, update.attempts) == ("done", 2)
+
+
+def test_update_fails_permanently_after_max_attempts(app_module, monkeypatch):
+    def handle(data):
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(app_module, "handle_telegram_update", handle)
+    processor = app_module.TelegramUpdateProcessor(max_attempts=2, base_backoff=5)
+    store_update(app_module, 1)
+
+    processor.process(1)
+    age(app_module, 1, 60)
+    processor.recover()
+
+    assert app_module.db.session.get(app_module.TelegramUpdate, 1).status == "failed"
+
+
+def test_processor_thread_recovers_updates_left_by_another_worker(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "handle_telegram_update", lambda data: "ignored")
+    store_update(app_module, 1)
+    age(app_module, 1, 120)  # queued in a worker that exited before running it
+    processor = app_module.TelegramUpdateProcessor(recover_interval=0.05)
+    processor.init_app(app_module.app)
+
+    processor.start()
+    try:
+        for _ in range(100):
+            app_module.db.session.expire_all()
+            if app_module.db.session.get(app_module.TelegramUpdate, 1).status == "done":
+                break
+            time.sleep(0.02)
+    finally:
+        processor.recover_interval = 3600  # park the daemon thread for the remaining tests
+
+    assert app_module.db.session.get(app_module.TelegramUpdate, 1).status == "done"